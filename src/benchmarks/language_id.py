@@ -0,0 +1,122 @@
+# Micro-benchmark: built-in nl/en identifier versus langdetect
+#
+# Runs both on a small labelled set of maintenance questions and reports
+# accuracy, the mean time per call (the built-in identifier without its
+# per-message memo, so the lookup tables themselves are measured) and whether
+# repeated runs give the same answers.
+#
+# Usage (from the src/ directory):
+#   python -m benchmarks.language_id --repeat 200
+
+import argparse
+import time
+
+from utils.language_id import identify_language
+
+SAMPLES = [
+    ("filament start traag", "nl"),
+    ("Waarom start het filament traag?", "nl"),
+    ("De vacuümpomp haalt de druk niet", "nl"),
+    ("Welke maatregel moet ik nemen bij een lek?", "nl"),
+    ("ionenbron geeft storing na opstarten", "nl"),
+    ("Hoe vervang ik de kathode", "nl"),
+    ("koeling valt uit", "nl"),
+    ("Bundelstroom te laag", "nl"),
+    ("Wat is de oorzaak van de drukstijging", "nl"),
+    ("spanning zakt weg tijdens het proces", "nl"),
+    ("lekkage bij de flens", "nl"),
+    ("Turbopomp maakt lawaai", "nl"),
+    # Short questions around words both languages use ("is", "we", "in")
+    ("De pomp is kapot", "nl"),
+    ("Is de pomp kapot?", "nl"),
+    ("De bundel is instabiel", "nl"),
+    ("druk is te hoog", "nl"),
+    ("gasflow te hoog", "nl"),
+    ("We hebben een lek in de kamer", "nl"),
+    ("storing op de voeding", "nl"),
+    # Keywords only, without stopwords
+    ("storing voeding", "nl"),
+    ("spanning valt weg", "nl"),
+    ("verwarming kapot", "nl"),
+    ("koelwater storing", "nl"),
+    ("pomp kapot", "nl"),
+    ("bundelstroom instabiel", "nl"),
+    ("klep lekt", "nl"),
+    ("turbopomp lawaai", "nl"),
+    ("filament starts slowly", "en"),
+    ("Why does the filament start slowly?", "en"),
+    ("The vacuum pump does not reach pressure", "en"),
+    ("Which measure should I take for a leak?", "en"),
+    ("ion source fault after startup", "en"),
+    ("How do I replace the cathode", "en"),
+    ("cooling fails", "en"),
+    ("Beam current too low", "en"),
+    ("What causes the pressure rise", "en"),
+    ("voltage drops during the process", "en"),
+    ("leakage at the flange", "en"),
+    ("Turbo pump is noisy", "en"),
+    ("The pump is broken", "en"),
+    ("Is the pump broken?", "en"),
+    ("The beam is unstable", "en"),
+    ("pressure is too high", "en"),
+    ("gas flow too high", "en"),
+    ("We have a leak in the chamber", "en"),
+    ("fault on the power supply", "en"),
+    ("power supply fault", "en"),
+    ("voltage drops", "en"),
+    ("heater broken", "en"),
+    ("cooling water fault", "en"),
+    ("pump broken", "en"),
+    ("beam current unstable", "en"),
+    ("valve leaking", "en"),
+    ("turbo pump noise", "en"),
+    ("heating not working", "en"),
+]
+
+
+def langdetect_language(text: str) -> str:
+    # The previous implementation of chatbot_service.detect_language
+    from langdetect import detect
+
+    try:
+        lang_code = detect(text)
+    except Exception:
+        lang_code = "en"
+    return "nl" if lang_code.startswith("nl") else "en"
+
+
+def measure(name: str, detect, repeat: int) -> dict:
+    texts = [text for text, _ in SAMPLES]
+    detect(texts[0])  # load profiles / tables outside the timing
+    runs = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        runs.append(tuple(detect(text) for text in texts))
+    elapsed = time.perf_counter() - started
+    first = runs[0]
+    return {
+        "name": name,
+        "accuracy": sum(guess == label for guess, (_, label) in zip(first, SAMPLES)) / len(SAMPLES),
+        "us_per_call": elapsed / (repeat * len(texts)) * 1e6,
+        "stable": all(run == first for run in runs),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compare the built-in language identifier with langdetect.")
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the sample set")
+    args = parser.parse_args(argv)
+
+    results = [
+        measure("language_id", identify_language.__wrapped__, args.repeat),
+        measure("language_id (memoized)", identify_language, args.repeat),
+        measure("langdetect", langdetect_language, args.repeat),
+    ]
+    print(f"{'identifier':<24}{'accuracy':>10}{'us/call':>12}{'stable':>8}")
+    for result in results:
+        print(f"{result['name']:<24}{result['accuracy']:>10.0%}{result['us_per_call']:>12.1f}"
+              f"{'yes' if result['stable'] else 'no':>8}")
+
+
+if __name__ == "__main__":
+    main()
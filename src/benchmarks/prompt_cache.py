@@ -0,0 +1,109 @@
+# Prompt-cache benchmark: previous versus current answer prompt layout
+#
+# Sends the same sequence of questions (alternating Dutch and English, with a
+# different graph context each time, as in real use) through both layouts and
+# reports, per layout, the prompt tokens, the prompt tokens OpenAI served from
+# its prompt cache (usage.prompt_tokens_details.cached_tokens), the billed
+# prompt tokens (cached tokens count at CACHED_PRICE_FACTOR of the input price)
+# and the median time to first token. The billed figure is the one to compare:
+# a longer prompt can show a higher cached share and still cost more. The
+# previous layout interpolated the answer language into the system prompt, so
+# its prefix changed between languages.
+#
+# Needs OPENAI_API_KEY; each run makes 2 x --rounds x len(QUESTIONS) streamed calls.
+#
+# Usage (from the src/ directory):
+#   python -m benchmarks.prompt_cache --rounds 2 --max-tokens 64
+
+import argparse
+import statistics
+import time
+
+from utils.chatbot_service import OPENAI_MODEL, build_messages, get_client
+from utils.language_id import identify_language
+
+# Price of a cached input token relative to an uncached one (gpt-4o)
+CACHED_PRICE_FACTOR = 0.5
+
+QUESTIONS = [
+    "filament start traag",
+    "Why does the vacuum pump not reach its pressure?",
+    "Bundelstroom te laag na het opstarten",
+    "The ion source gives a fault after startup",
+]
+
+CONTEXT_TEMPLATE = """Location: {location}
+  Symptom: {question}
+    Reason: Worn component
+    Measure: Inspect and replace the component"""
+
+
+def previous_messages(messages_history: list, graph_context: str, user_lang: str) -> list:
+    # The layout before the byte-stable prefix: language interpolated into the system prompt
+    system_msg = (
+        f"You are an assistant specialized in industrial maintenance and troubleshooting. "
+        f"Your role is to generate accurate, natural-language recommendations for technicians working with manufacturing equipment, particularly the Ion Beam Machine. "
+        f"You can see the full conversation history in this chat and should use it to answer follow-up questions. "
+        f"The user is currently speaking in {'Dutch' if user_lang == 'nl' else 'English'}, so respond in that language. "
+        f"Use the provided knowledge graph context for factual information when relevant, and clearly mark such content as [Graph]. "
+        f"Begin each response by briefly explaining any key concepts or entities from the user's question, especially if they relate to the Ion Beam Machine. "
+        f"Then, provide a complete answer that incorporates relevant information from the knowledge graph (if any). "
+        f"If the answer cannot be grounded in the graph, rely on your general knowledge and mark those parts as [LLM]. "
+        f"If the question is unrelated to the Ion Beam Machine or the graph content, answer based on [LLM] knowledge only."
+    )
+    *prior_messages, last_user = messages_history
+    return [
+        {"role": "system", "content": system_msg},
+        *prior_messages,
+        {"role": "system", "content": f"Graph context:\n{graph_context}"},
+        last_user,
+    ]
+
+
+def measure(build, rounds: int, max_tokens: int) -> dict:
+    client = get_client()
+    prompt_tokens, cached_tokens, first_token_s = [], [], []
+    for round_number in range(rounds):
+        for index, question in enumerate(QUESTIONS):
+            context = CONTEXT_TEMPLATE.format(location=f"Component {round_number}-{index}", question=question)
+            messages = build([{"role": "user", "content": question}], context, identify_language(question))
+            started = time.perf_counter()
+            first = None
+            stream = client.chat.completions.create(
+                model=OPENAI_MODEL, messages=messages, stream=True, max_tokens=max_tokens,
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                if first is None and chunk.choices and chunk.choices[0].delta.content:
+                    first = time.perf_counter() - started
+                if chunk.usage is not None:
+                    details = chunk.usage.prompt_tokens_details
+                    prompt_tokens.append(chunk.usage.prompt_tokens)
+                    cached_tokens.append((details.cached_tokens or 0) if details else 0)
+            first_token_s.append(first or time.perf_counter() - started)
+    return {
+        "prompt_tokens": statistics.mean(prompt_tokens),
+        "cached_tokens": statistics.mean(cached_tokens),
+        "cached_ratio": sum(cached_tokens) / sum(prompt_tokens),
+        "billed_tokens": statistics.mean(
+            prompt - cached * (1 - CACHED_PRICE_FACTOR) for prompt, cached in zip(prompt_tokens, cached_tokens)
+        ),
+        "first_token_s": statistics.median(first_token_s),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compare prompt-cache hits of the previous and current prompt layout.")
+    parser.add_argument("--rounds", type=int, default=2, help="passes over the question list per layout")
+    parser.add_argument("--max-tokens", type=int, default=64, help="answer tokens per call (kept short)")
+    args = parser.parse_args(argv)
+
+    print(f"{'layout':<10}{'prompt tok':>12}{'cached tok':>12}{'cached':>9}{'billed tok':>12}{'first token':>13}")
+    for name, build in (("previous", previous_messages), ("current", build_messages)):
+        result = measure(build, args.rounds, args.max_tokens)
+        print(f"{name:<10}{result['prompt_tokens']:>12.0f}{result['cached_tokens']:>12.0f}"
+              f"{result['cached_ratio']:>9.0%}{result['billed_tokens']:>12.0f}{result['first_token_s']:>12.3f}s")
+
+
+if __name__ == "__main__":
+    main()
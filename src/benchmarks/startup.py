@@ -0,0 +1,108 @@
+# Cold-start benchmark for the Streamlit app
+#
+# Two measurements, each in fresh interpreter processes so nothing is cached
+# in sys.modules:
+#
+# - `python -X importtime` for the modules the app imports before its first
+#   render and, for comparison, for the modules only needed once a question is
+#   asked. The slowest top-level imports are listed with their cumulative time.
+# - Time to first render: the app script run once through Streamlit's AppTest,
+#   reported separately from the time it takes to import AppTest itself.
+#
+# Usage (from the src/ directory):
+#   python -m benchmarks.startup --runs 3 --top 15
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+APP_PATH = SRC_DIR / "streamlit_app.py"
+
+# What streamlit_app.py imports at module level
+STARTUP_IMPORTS = ["streamlit", "utils.resources", "utils.conversation_store"]
+# What it imports lazily once the first question is asked
+QUESTION_IMPORTS = [
+    "utils.answer_cache",
+    "utils.async_retriever",
+    "utils.chatbot_service",
+    "utils.diagnosis_service",
+    "utils.retriever",
+]
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+FIRST_RENDER_SNIPPET = """
+import json, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file({app_path!r}, default_timeout=120)
+app.run()
+rendered = time.perf_counter()
+print(json.dumps({{
+    "apptest_import_s": imported - started,
+    "first_render_s": rendered - imported,
+    "exceptions": [str(exception.value) for exception in app.exception],
+}}))
+"""
+
+
+def import_profile(modules: list) -> list:
+    """(cumulative seconds, self seconds, module) for each top-level import, slowest first."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        # Top-level imports have a single space of indentation in the name column
+        if match and len(match.group(3)) == 1:
+            rows.append((int(match.group(2)) / 1e6, int(match.group(1)) / 1e6, match.group(4)))
+    return sorted(rows, reverse=True)
+
+
+def first_render() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_RENDER_SNIPPET.format(app_path=str(APP_PATH))],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_imports(title: str, modules: list, top: int) -> None:
+    rows = import_profile(modules)
+    print(f"\n{title}: {sum(row[0] for row in rows):.3f}s cumulative")
+    print(f"{'cumulative s':>14}{'self s':>10}  module")
+    for cumulative, own, module in rows[:top]:
+        print(f"{cumulative:>14.3f}{own:>10.3f}  {module}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Measure import time and time to first render of the app.")
+    parser.add_argument("--runs", type=int, default=3, help="first-render runs (median is reported)")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--skip-render", action="store_true", help="only report import times")
+    args = parser.parse_args(argv)
+
+    print_imports("Imports before first render", STARTUP_IMPORTS, args.top)
+    print_imports("Imports deferred to the first question", QUESTION_IMPORTS, args.top)
+
+    if args.skip_render:
+        return
+    runs = [first_render() for _ in range(args.runs)]
+    print(f"\nTime to first render over {len(runs)} runs (median):")
+    print(f"  AppTest import  {statistics.median(run['apptest_import_s'] for run in runs):.3f}s")
+    print(f"  first render    {statistics.median(run['first_render_s'] for run in runs):.3f}s")
+    exceptions = {message for run in runs for message in run["exceptions"]}
+    for message in exceptions:
+        print(f"  app raised: {message}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Compare the row and aggregated retrieval traversals on the same seed nodes
+#
+# Each traversal is run under PROFILE from a fixed sample of seed nodes (the
+# nodes the hybrid search would hand it), and the DB hits, rows returned and
+# wall time are reported side by side. By default the seeds are the symptoms
+# with the most reason x measure combinations plus a random sample of other
+# TextChunk nodes, so the cross-product case is always represented.
+#
+# Usage (from the src/ directory):
+#   python -m benchmarks.traversal --seeds 50 --repeat 5
+
+import argparse
+import statistics
+import time
+
+from utils.neo4j_connection import create_driver
+from utils.traversal_queries import TRAVERSAL_QUERIES
+
+SEED_QUERY = """
+CALL {
+  MATCH (s:FaultSymptom)
+  RETURN elementId(s) AS node_id
+  ORDER BY COUNT { (s)-[:CAUSED_BY]->() } * COUNT { (s)-[:MITIGATED_BY]->() } DESC
+  LIMIT $worst
+  UNION
+  MATCH (n:TextChunk)
+  RETURN elementId(n) AS node_id
+  ORDER BY rand()
+  LIMIT $sample
+}
+RETURN DISTINCT node_id
+"""
+
+
+def seed_query(traversal: str) -> str:
+    return (
+        "UNWIND $seeds AS node_id\n"
+        "MATCH (node) WHERE elementId(node) = node_id\n"
+        "WITH node, 1.0 AS score\n"
+        + traversal
+    )
+
+
+def profile_totals(plan: dict) -> int:
+    return plan.get("dbHits", 0) + sum(profile_totals(child) for child in plan.get("children", []))
+
+
+def run(driver, mode: str, seeds: list, repeat: int, database=None) -> dict:
+    query = seed_query(TRAVERSAL_QUERIES[mode])
+    records, summary, _ = driver.execute_query("PROFILE " + query, seeds=seeds, database_=database)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        driver.execute_query(query, seeds=seeds, database_=database)
+        timings.append(time.perf_counter() - started)
+    return {
+        "mode": mode,
+        "db_hits": profile_totals(summary.profile),
+        "rows": len(records),
+        "median_ms": statistics.median(timings) * 1000 if timings else 0.0,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval traversal modes against each other.")
+    parser.add_argument("--seeds", type=int, default=50, help="random TextChunk seed nodes")
+    parser.add_argument("--worst", type=int, default=10, help="symptoms with the most reason x measure pairs")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per mode after the profiled run")
+    args = parser.parse_args(argv)
+
+    driver = create_driver()
+    try:
+        records, _, _ = driver.execute_query(SEED_QUERY, worst=args.worst, sample=args.seeds)
+        seeds = [record["node_id"] for record in records]
+        print(f"Profiling {len(seeds)} seed nodes")
+        results = [run(driver, mode, seeds, args.repeat) for mode in TRAVERSAL_QUERIES]
+    finally:
+        driver.close()
+
+    print(f"{'mode':<12}{'db hits':>12}{'rows':>10}{'median ms':>12}")
+    for result in results:
+        print(f"{result['mode']:<12}{result['db_hits']:>12}{result['rows']:>10}{result['median_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# Headless diagnosis API for MES terminals and the handheld app
+#
+# A plain ASGI application served by uvicorn. All requests of a worker share
+# one event loop: generation streams from OpenAI with the async client, and
+# retrieval is awaited on the background loop the Neo4j async driver is bound
+# to (see utils/async_retriever.py), so a slow answer never blocks the others.
+# API_WORKERS starts that many worker processes, each with its own drivers.
+#
+# Endpoints:
+#   GET  /health    {"status": "ok"}
+#   GET  /stats     calls saved by coalescing identical in-flight questions, and prompt
+#                   tokens served from OpenAI's prompt cache
+#   POST /diagnose  {"question": "...", "history": [{"role": "user"|"assistant", "content": "..."}],
+#                    "stream": true}
+#
+# With "stream": true (the default) the answer is sent as server-sent events:
+#   event: context  {"lang": "nl", "graph_found": true}
+#   event: token    {"text": "..."}            (repeated)
+#   event: done     {"answer": "...", "graph": {"nodes": [...], "links": [...]}}
+#   event: error    {"error": "..."}           (instead of done, if generation fails)
+# With "stream": false the done payload (plus "lang") is returned as one JSON body.
+#
+# Run (from the repository root):
+#   python src/diagnosis_api.py
+#   uvicorn diagnosis_api:app --app-dir src --workers 4
+
+import asyncio
+import json
+import os
+import traceback
+from pathlib import Path
+
+from utils import resources
+from utils.async_retriever import on_background_loop
+from utils.chatbot_service import prompt_cache_stats
+from utils.diagnosis_service import answer_graph, astream_answer, coalescing_stats, prepare
+from utils.history_manager import fit_history
+
+SRC_DIR = Path(__file__).resolve().parent
+
+DEFAULT_HOST = "0.0.0.0"
+DEFAULT_PORT = 8000
+DEFAULT_WORKERS = 1
+MAX_BODY_BYTES = 64 * 1024
+
+
+class BadRequest(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+async def read_json(receive) -> dict:
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ClientDisconnected()
+        body.extend(message.get("body", b""))
+        if len(body) > MAX_BODY_BYTES:
+            raise BadRequest(f"request body larger than {MAX_BODY_BYTES} bytes")
+        if not message.get("more_body"):
+            break
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError as error:
+        raise BadRequest(f"invalid JSON: {error}") from None
+    if not isinstance(payload, dict):
+        raise BadRequest("expected a JSON object")
+    return payload
+
+
+def parse_request(payload: dict) -> tuple:
+    """(question, history, stream) from a /diagnose body."""
+    question = payload.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise BadRequest('"question" must be a non-empty string')
+    history = payload.get("history") or []
+    if not isinstance(history, list) or not all(
+        isinstance(message, dict)
+        and message.get("role") in ("user", "assistant")
+        and isinstance(message.get("content"), str)
+        for message in history
+    ):
+        raise BadRequest('"history" must be a list of {"role": "user"|"assistant", "content": str}')
+    history = [{"role": message["role"], "content": message["content"]} for message in history]
+    # Clients keep their own history; only its newest turns within HISTORY_TOKEN_BUDGET are used
+    return question.strip(), fit_history(history), bool(payload.get("stream", True))
+
+
+async def send_json(send, status: int, payload: dict) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def sse_event(event: str, payload: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+
+
+async def watch_disconnect(receive, disconnected: asyncio.Event) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+    disconnected.set()
+
+
+async def diagnose(receive, send) -> None:
+    try:
+        question, history, stream = parse_request(await read_json(receive))
+    except BadRequest as error:
+        await send_json(send, 400, {"error": str(error)})
+        return
+
+    # The first request of a worker may still be connecting; keep that off the event loop
+    retriever = await asyncio.to_thread(resources.get_retriever)
+    diagnosis = await on_background_loop(prepare(retriever, question, history))
+
+    if not stream:
+        answer = "".join([chunk async for chunk in astream_answer(diagnosis)])
+        nodes, links = answer_graph(diagnosis, answer)
+        await send_json(send, 200, {"answer": answer, "lang": diagnosis.lang, "graph": {"nodes": nodes, "links": links}})
+        return
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            # Keep reverse proxies from buffering the stream
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+    await send({
+        "type": "http.response.body",
+        "body": sse_event("context", {"lang": diagnosis.lang, "graph_found": diagnosis.graph_found}),
+        "more_body": True,
+    })
+
+    disconnected = asyncio.Event()
+    watcher = asyncio.create_task(watch_disconnect(receive, disconnected))
+    parts = []
+    tokens = astream_answer(diagnosis)
+    try:
+        async for chunk in tokens:
+            if disconnected.is_set():
+                # Stop paying for tokens nobody will read
+                return
+            parts.append(chunk)
+            await send({"type": "http.response.body", "body": sse_event("token", {"text": chunk}), "more_body": True})
+        answer = "".join(parts)
+        nodes, links = answer_graph(diagnosis, answer)
+        final = sse_event("done", {"answer": answer, "graph": {"nodes": nodes, "links": links}})
+    except Exception as error:
+        traceback.print_exc()
+        final = sse_event("error", {"error": str(error)})
+    finally:
+        await tokens.aclose()
+        watcher.cancel()
+    await send({"type": "http.response.body", "body": final})
+
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Connect and prime the indexes in the background, as the Streamlit app does
+            resources.start_warm_up()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await asyncio.to_thread(resources.close)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    route = (scope["method"], scope["path"].rstrip("/") or "/")
+    if route == ("GET", "/health"):
+        await send_json(send, 200, {"status": "ok"})
+    elif route == ("GET", "/stats"):
+        await send_json(send, 200, {**coalescing_stats(), "prompt_cache": prompt_cache_stats()})
+    elif route == ("POST", "/diagnose"):
+        try:
+            await diagnose(receive, send)
+        except ClientDisconnected:
+            pass
+        except Exception as error:
+            # Errors before the response started (retrieval, Neo4j, configuration)
+            traceback.print_exc()
+            await send_json(send, 503, {"error": str(error)})
+    elif scope["path"].rstrip("/") in ("/health", "/stats", "/diagnose"):
+        await send_json(send, 405, {"error": "method not allowed"})
+    else:
+        await send_json(send, 404, {"error": "not found"})
+
+
+def main() -> None:
+    import uvicorn
+
+    uvicorn.run(
+        "diagnosis_api:app",
+        app_dir=str(SRC_DIR),
+        host=os.getenv("API_HOST") or DEFAULT_HOST,
+        port=int(os.getenv("API_PORT") or DEFAULT_PORT),
+        workers=int(os.getenv("API_WORKERS") or DEFAULT_WORKERS),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,68 @@
 import streamlit as st
-import streamlit.components.v1 as components
-import json
 import os
-import pandas as pd
+import time
+import uuid
 
-from utils.chatbot_service import detect_language, generate_answer_stream
-from utils.retriever import retriever  # HybridCypherRetriever instance
-from pathlib import Path
+# Only light modules are imported up front. pandas, the OpenAI SDK, neo4j_graphrag,
+# NumPy and tiktoken are imported where they are first used, so the first page
+# render does not wait for them (see benchmarks/startup.py).
+from utils.resources import get_embedder, get_retriever, start_warm_up
 
 st.set_page_config(layout="wide", page_title="Chatbot Fault Diagnosis Assistant with Knowledge Graph Context")
 
+# Connect, verify the indexes and prime them in the background while the page renders
+start_warm_up()
+
+@st.cache_resource
+def get_conversation_store():
+    from utils.conversation_store import ConversationStore
+
+    # One SQLite-backed store (CONVERSATION_DB_PATH) shared by all sessions
+    return ConversationStore()
+
+@st.cache_resource
+def get_history_manager():
+    from utils.history_manager import HistoryManager
+
+    # Recent turns verbatim within HISTORY_TOKEN_BUDGET, older ones as a rolling summary
+    return HistoryManager(get_conversation_store())
+
+@st.cache_resource
+def get_answer_cache():
+    from utils.answer_cache import SemanticAnswerCache, semantic_cache_enabled
+
+    # Shared by all sessions; None unless SEMANTIC_ANSWER_CACHE is enabled
+    return SemanticAnswerCache(get_embedder()) if semantic_cache_enabled() else None
+
 # Session State and Conversations
-if "conversations" not in st.session_state:
-    st.session_state.conversations = [{
-    "title": "Conversation 1",
-    "messages": [],
-    "latest_graph": {"nodes": [], "links": []}
-    }]
-    st.session_state.current_conv_index = 0
-    st.session_state.graph_panel_expanded = True
+# Conversations are kept in the conversation store under a session key that is
+# also put in the URL, so reopening the URL (or a restarted app) restores them.
+# The session itself only holds ids and how much history is shown.
+store = get_conversation_store()
+if "session_key" not in st.session_state:
+    st.session_state.session_key = st.query_params.get("session") or uuid.uuid4().hex
+    st.session_state.shown_pairs = {}
+if st.query_params.get("session") != st.session_state.session_key:
+    st.query_params["session"] = st.session_state.session_key
+
+conversations = store.conversations(st.session_state.session_key)
+if not conversations:
+    store.create_conversation(st.session_state.session_key)
+    conversations = store.conversations(st.session_state.session_key)
+if st.session_state.get("current_conv_id") not in {conv_id for conv_id, _ in conversations}:
+    st.session_state.current_conv_id = conversations[-1][0]
 
 # Short-hand references
-conversations = st.session_state.conversations
-current_idx = st.session_state.current_conv_index
-current_conv = conversations[current_idx]
+current_id = st.session_state.current_conv_id
 
 # --- Sidebar: Conversation Navigation ---
 st.sidebar.title("Conversations")
-for i, conv in enumerate(conversations):
-    btn_label = conv["title"]
-    if st.sidebar.button(btn_label, key=f"select_{i}"):
-        st.session_state.current_conv_index = i
+for conv_id, title in conversations:
+    if st.sidebar.button(title, key=f"select_{conv_id}"):
+        st.session_state.current_conv_id = conv_id
         st.rerun()  
 if st.sidebar.button("Start New Conversation", key="new_conv"):
-    new_index = len(conversations)
-    conversations.append({
-        "title": f"Conversation {new_index+1}",
-        "messages": [],
-        "latest_graphs": [],
-        "latest_graph": {"nodes": [], "links": []}
-    })
-    st.session_state.current_conv_index = new_index
+    st.session_state.current_conv_id = store.create_conversation(st.session_state.session_key)
     st.rerun()
 
 # --- Main Interface (Single Page, no columns) ---
@@ -51,11 +73,11 @@ def graph_context_content(graph_data, cypher_query, table_rows, *, pair_id):
     with tabs[0]:
         if graph_data and graph_data.get("nodes"):
             ph = st.empty() 
-            template_path = Path("src/d3_graph.html")
-            html_str = template_path.read_text(encoding="utf-8").replace(
-                "{{GRAPH_DATA_JSON}}", json.dumps(graph_data)
-            )
+            # Template with bundled D3 is read once; the graph JSON is cached per (pair, graph hash)
+            from utils.graph_view import render_graph_html
+            html_str = render_graph_html(graph_data, pair_id)
             with ph:                                   # <--- use it as a container
+                import streamlit.components.v1 as components
                 components.html(html_str, height=400, scrolling=True)
         else:
             st.info("No graph data found for this question.")
@@ -73,35 +95,43 @@ def graph_context_content(graph_data, cypher_query, table_rows, *, pair_id):
             def style_row(row):
                 color = 'background-color: #d9d9d9;' if row["Entity"] == "FaultLocation" else ''
                 return [color, color]
+            import pandas as pd
             styled_df = pd.DataFrame(table_rows)
             st.dataframe(styled_df.style.apply(style_row, axis=1), use_container_width=True)
         else:
             st.info("No graph entities found for this question.")
 
-# Display conversation history with expanders/tabs under assistant replies
-i = 0
-pair_idx = 0
-while i < len(current_conv["messages"]):
-    if current_conv["messages"][i]["role"] == "user":
-        # Show user message
-        with st.chat_message("user"):
-            st.markdown(f" {current_conv['messages'][i]['content']}")
-        # Check if next message is assistant
-        if i + 1 < len(current_conv["messages"]) and current_conv["messages"][i+1]["role"] == "assistant":
-            # Show assistant message
-            with st.chat_message("assistant"):
-                st.markdown(f" {current_conv['messages'][i+1]['content']}")
-            # Attach expanders/tabs with answer context
-            if "latest_graphs" in current_conv and pair_idx < len(current_conv["latest_graphs"]):
-                graph_data = current_conv["latest_graphs"][pair_idx].get("graph_data", {"nodes": [], "links": []})
-                cypher_query = current_conv["latest_graphs"][pair_idx].get("cypher_query", "")
-                table_rows = current_conv["latest_graphs"][pair_idx].get("table_rows", [])
-                with st.expander("Show Knowledge Graph Context", expanded=False):
-                    graph_context_content(graph_data, cypher_query, table_rows, pair_id=pair_idx)
-            pair_idx += 1
-        i += 2
-    else:
-        i += 1
+def context_panel(message_id):
+    # A toggle instead of st.expander: an expander's body runs on every rerun even
+    # while collapsed, so the tabs, dataframe and graph iframe would always be built.
+    # The context itself is only loaded from the store while the panel is open.
+    if st.toggle("Show Knowledge Graph Context", key=f"context_{message_id}"):
+        context = store.answer_context(message_id)
+        with st.container(border=True):
+            graph_context_content(
+                context["graph_data"], context["cypher_query"], context["table_rows"], pair_id=message_id
+            )
+
+# Display conversation history with context panels under assistant replies.
+# Only the last HISTORY_WINDOW pairs are loaded; older ones stay behind "load more".
+history_window = int(os.getenv("HISTORY_WINDOW") or 5)
+shown_pairs = st.session_state.shown_pairs.get(current_id, history_window)
+pairs, hidden = store.recent_pairs(current_id, shown_pairs)
+if hidden:
+    if st.button(f"Load earlier messages ({hidden} hidden)", key=f"load_more_{current_id}"):
+        st.session_state.shown_pairs[current_id] = shown_pairs + history_window
+        st.rerun()
+
+for question, answer in pairs:
+    # Show user message
+    with st.chat_message("user"):
+        st.markdown(f" {question['content']}")
+    if answer is not None:
+        # Show assistant message
+        with st.chat_message("assistant"):
+            st.markdown(f" {answer['content']}")
+        # Attach the answer context
+        context_panel(answer["id"])
 
 
 # Persistent input at bottom (no st.form needed)
@@ -112,127 +142,74 @@ if user_input:
     st.rerun()
 
 if "pending_user_input" in st.session_state:
-    user_input = st.session_state.pending_user_input
+    from utils.answer_cache import stream_cached_answer, stream_translated_answer
+    from utils.async_retriever import run_async
+    from utils.chatbot_service import batched_stream, get_client
+    from utils.diagnosis_service import answer_graph, prepare, stream_answer
+
+    # Taken out right away, so a question that fails is not re-run on every rerun
+    user_input = st.session_state.pop("pending_user_input")
 
     # 1) show the question right away
     with st.chat_message("user"):
         st.markdown(user_input)
 
+    # --- Retrieval, graph data and prompt context (utils/diagnosis_service.py) ---
+    # Token-budgeted history: a summary of older turns plus the newest turns verbatim
+    recent_messages = get_history_manager().history(current_id)
+    diagnosis = run_async(prepare(get_retriever(), user_input, recent_messages))
+    lang_used = diagnosis.lang
+
     # 2) persist it in the conversation for future reruns
-    current_conv["messages"].append(
-        {"role": "user", "content": user_input, "lang": detect_language(user_input)}
-    )
-
-    # --- Info Extraction for Graph Context etc. ---
-    table_rows = []
-    lang = detect_language(user_input)
-    retriever_result = retriever.search(query_text=user_input, top_k=2)
-    
-    context_str = ""
-    node_dict = {}
-    links = []
-    table_set = set()
-
-    for item in retriever_result.items:
-        meta = item.metadata
-        if not meta:
-            continue
-
-        if meta.get("location_id") and meta.get("location"):
-            node_dict[meta["location_id"]] = {"id": meta["location_id"], "label": meta["location"], "type": "location"}
-        if meta.get("symptom_id") and meta.get("symptom"):
-            node_dict[meta["symptom_id"]] = {"id": meta["symptom_id"], "label": meta["symptom"], "type": "symptom"}
-            if meta.get("location_id"):
-                links.append({"source": meta["location_id"], "target": meta["symptom_id"], "type": "HAS_FAULT"})
-        if meta.get("reason_id") and meta.get("reason"):
-            node_dict[meta["reason_id"]] = {"id": meta["reason_id"], "label": meta["reason"], "type": "reason"}
-            if meta.get("symptom_id"):
-                links.append({"source": meta["symptom_id"], "target": meta["reason_id"], "type": "CAUSED_BY"})
-        if meta.get("measure_id") and meta.get("measure"):
-            node_dict[meta["measure_id"]] = {"id": meta["measure_id"], "label": meta["measure"], "type": "measure"}
-            if meta.get("symptom_id"):
-                links.append({"source": meta["symptom_id"], "target": meta["measure_id"], "type": "MITIGATED_BY"})
-
-        snippet = ""
-        if meta.get("location"):
-            snippet += f"Location: {meta['location']}\n"
-            if ( "FaultLocation", meta["location"]) not in table_set:
-                table_rows.append({"Entity": "FaultLocation", "Remarks": meta["location"]})
-                table_set.add(( "FaultLocation", meta["location"] ))
-        if meta.get("symptom"):
-            snippet += f"Symptom: {meta['symptom']}\n"
-            if ( "FaultSymptom", meta["symptom"]) not in table_set:
-                table_rows.append({"Entity": "FaultSymptom", "Remarks": meta["symptom"]})
-                table_set.add(( "FaultSymptom", meta["symptom"] ))
-        if meta.get("reason"):
-            snippet += f"Reason: {meta['reason']}\n"
-            if ( "FaultReason", meta["reason"]) not in table_set:
-                table_rows.append({"Entity": "FaultReason", "Remarks": meta["reason"]})
-                table_set.add(( "FaultReason", meta["reason"] ))
-        if meta.get("measure"):
-            snippet += f"Measure: {meta['measure']}\n"
-            if ( "FaultMeasure", meta["measure"]) not in table_set:
-                table_rows.append({"Entity": "FaultMeasure", "Remarks": meta["measure"]})
-                table_set.add(( "FaultMeasure", meta["measure"] ))
-        context_str += snippet + "\n"
-
-    if not context_str:
-        context_str = "(No direct graph context found; relying on general knowledge.)"
-        graph_found = bool(node_dict)
-    else:
-        graph_found = bool(node_dict)
-
-    lang_used = lang
-    for msg in reversed(current_conv["messages"]):
-        if msg["role"] == "user" and "lang" in msg:
-            lang_used = msg["lang"]
-            break
-    
-    #Last 3 pair of history
-    recent_messages = current_conv["messages"][-4:] + [{"role": "user", "content": user_input}]
+    store.add_message(current_id, "user", user_input, lang_used)
+
+    # Reuse an earlier answer to a near-duplicate question; only for opening
+    # questions, since follow-ups depend on the conversation history
+    answer_cache = get_answer_cache()
+    use_answer_cache = answer_cache is not None and store.count_questions(current_id) == 1
+    cached_answer = None
+    if use_answer_cache:
+        cached_answer = answer_cache.lookup(user_input, diagnosis.nodes.keys(), lang_used)
 
     # ---- Streaming answer ----
+    response_parts = []
+
     def stream_response():
-        response_content = ""
-        for chunk in generate_answer_stream(recent_messages, context_str, lang_used):
-            response_content += chunk
-            yield chunk
-        # Only after the full response is received, append the assistant message
-        current_conv["messages"].append({"role": "assistant", "content": response_content})
-        st.session_state._last_answer = response_content
-
-        # Only after the answer is done, build and append latest_graphs once:
-        used_graph = "[Graph]" in response_content
-        if "latest_graphs" not in current_conv:
-            current_conv["latest_graphs"] = []
-
-        if graph_found and used_graph:
-            graph_data = {"nodes": list(node_dict.values()), "links": links}
-            node_ids = [f"'{node['id']}'" for node in node_dict.values()]
-            id_list_str = ", ".join(node_ids)
-            cypher_query = f"""
-            MATCH (n)
-            WHERE elementId(n) IN [{id_list_str}]
-            OPTIONAL MATCH (n)-[r]->(m)
-            WHERE elementId(m) IN [{id_list_str}]
-            RETURN n, r, m
-            """
-            current_conv["latest_graph"] = graph_data
-            current_conv["latest_graphs"].append({
-                "graph_data": graph_data,
-                "cypher_query": cypher_query,
-                "table_rows": table_rows
-            })
+        if cached_answer is not None and cached_answer.lang == lang_used:
+            answer_stream = stream_cached_answer(cached_answer.answer)
+        elif cached_answer is not None:
+            # Cached in the other language: a short translation call instead of a full generation
+            answer_stream = stream_translated_answer(get_client(), cached_answer.answer, lang_used)
         else:
-            current_conv["latest_graph"] = {"nodes": [], "links": []}
-            current_conv["latest_graphs"].append({
-                "graph_data": {"nodes": [], "links": []},
-                "cypher_query": "",
-                "table_rows": []
-            })
-        # Clean up pending input so next question works
-        del st.session_state.pending_user_input
-        st.rerun()  # Force rerun to immediately show tabs after streaming
-
-    with st.chat_message("assistant"):
-        st.write_stream(stream_response)
+            answer_stream = stream_answer(diagnosis)
+        # Tokens are coalesced into ~STREAM_BATCH_MS pieces so the UI updates a few times per second
+        for chunk in batched_stream(answer_stream):
+            response_parts.append(chunk)
+            yield chunk
+
+    # Placeholders keep the answer and its context panel in place, so the
+    # turn can be finished without rerunning (and re-rendering) the whole page
+    assistant_slot = st.chat_message("assistant")
+    context_slot = st.empty()
+    started = time.perf_counter()
+    with assistant_slot:
+        st.write_stream(stream_response())
+    response_content = "".join(response_parts)
+    if use_answer_cache and cached_answer is None:
+        answer_cache.store(
+            user_input, diagnosis.nodes.keys(), lang_used, response_content, time.perf_counter() - started
+        )
+    elif use_answer_cache and cached_answer.lang != lang_used:
+        # Keep the translation too, so the next asker in this language gets it directly
+        answer_cache.store(
+            user_input, diagnosis.nodes.keys(), lang_used, response_content, cached_answer.generation_seconds
+        )
+
+    # Only after the full response is received, store the assistant message together
+    # with references to the graph nodes it was grounded on (if it used them)
+    message_id = store.add_answer(current_id, response_content, *answer_graph(diagnosis, response_content))
+    st.session_state._last_answer = response_content
+
+    # Show the context panel under the new answer, as the history loop does on later runs
+    with context_slot.container():
+        context_panel(message_id)
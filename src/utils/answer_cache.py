@@ -0,0 +1,145 @@
+# Opt-in semantic answer cache for near-duplicate questions
+#
+# Stores (question embedding, retrieved node ids, answer). A new question reuses
+# an earlier answer when its embedding is close enough to the earlier question
+# AND retrieval returned an overlapping set of graph nodes, so two phrasings of
+# the same problem ("filament start traag" / "filaments starting slowly") share
+# one GPT-4o generation while a similar-sounding question about a different
+# component does not. An answer cached in the other language is streamed
+# through a short translation call (SEMANTIC_CACHE_TRANSLATION_MODEL) instead;
+# an entry in the asker's own language is preferred when both match.
+
+import os
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+DEFAULT_MIN_NODE_OVERLAP = 0.5
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TRANSLATION_MODEL = "gpt-4o-mini"
+
+ANSWER_TRANSLATION_PROMPT = (
+    "You translate maintenance answers about an Ion Beam Machine for technicians. "
+    "Translate the answer into {language}. Keep the [Graph] and [LLM] markers where they are, "
+    "keep part names, alarm codes and units as written, and keep the formatting. "
+    "Reply with the translation only."
+)
+
+
+def semantic_cache_enabled() -> bool:
+    return os.getenv("SEMANTIC_ANSWER_CACHE", "").strip().lower() in ("1", "true", "yes")
+
+
+def node_overlap(a: frozenset, b: frozenset) -> float:
+    # Two questions that both found no graph context count as fully overlapping
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    node_ids: frozenset
+    lang: str
+    answer: str
+    generation_seconds: float
+
+
+class SemanticAnswerCache:
+    """Nearest-previous-question lookup over recent answers, with hit/miss and latency-saved counters."""
+
+    def __init__(self, embedder, threshold: float = None, min_overlap: float = None, maxsize: int = None):
+        self.embedder = embedder
+        if threshold is None:
+            threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD") or DEFAULT_SIMILARITY_THRESHOLD)
+        if min_overlap is None:
+            min_overlap = float(os.getenv("SEMANTIC_CACHE_MIN_OVERLAP") or DEFAULT_MIN_NODE_OVERLAP)
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.maxsize = maxsize or DEFAULT_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self.translated = 0
+        self.seconds_saved = 0.0
+        self._entries = []
+        self._vectors = None
+        self._lock = threading.Lock()
+
+    def _unit_vector(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embedder.embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def lookup(self, question: str, node_ids, lang: str):
+        """Return the best matching CachedAnswer, or None on a miss; its lang may differ from lang."""
+        node_ids = frozenset(node_ids)
+        vector = self._unit_vector(question)
+        with self._lock:
+            match = None
+            if self._entries:
+                similarities = self._vectors @ vector
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.threshold:
+                        break
+                    entry = self._entries[index]
+                    if node_overlap(entry.node_ids, node_ids) < self.min_overlap:
+                        continue
+                    if entry.lang == lang:
+                        match = entry
+                        break
+                    # Needs a translation; keep looking for one in the asker's language
+                    match = match or entry
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.translated += match.lang != lang
+                self.seconds_saved += match.generation_seconds
+            return match
+
+    def store(self, question: str, node_ids, lang: str, answer: str, generation_seconds: float) -> None:
+        entry = CachedAnswer(question, frozenset(node_ids), lang, answer, generation_seconds)
+        vector = self._unit_vector(question)[np.newaxis, :]
+        with self._lock:
+            self._entries.append(entry)
+            self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+            if len(self._entries) > self.maxsize:
+                # Oldest answers go first
+                self._entries = self._entries[-self.maxsize:]
+                self._vectors = self._vectors[-self.maxsize:]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "translated": self.translated,
+            "seconds_saved": round(self.seconds_saved, 2),
+            "entries": len(self._entries),
+        }
+
+
+def stream_cached_answer(answer: str, chunk_chars: int = 64):
+    # Yield in a few large pieces so the UI renders the whole answer at once
+    for start in range(0, len(answer), chunk_chars):
+        yield answer[start:start + chunk_chars]
+
+
+def stream_translated_answer(client, answer: str, lang: str, model: str = None):
+    """Stream a cached answer translated into lang ("nl" or "en") with a small model."""
+    response_stream = client.chat.completions.create(
+        model=model or os.getenv("SEMANTIC_CACHE_TRANSLATION_MODEL") or DEFAULT_TRANSLATION_MODEL,
+        messages=[
+            {"role": "system",
+             "content": ANSWER_TRANSLATION_PROMPT.format(language="Dutch" if lang == "nl" else "English")},
+            {"role": "user", "content": answer},
+        ],
+        stream=True,
+        temperature=0,
+    )
+    for chunk in response_stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
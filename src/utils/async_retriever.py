@@ -0,0 +1,139 @@
+# Asynchronous hybrid retrieval
+#
+# The synchronous HybridCypherRetriever embeds the question, then runs the
+# vector, fulltext and traversal steps in one statement, so the Neo4j work only
+# starts once the OpenAI embedding call has returned. AsyncHybridRetriever
+# starts the fulltext query immediately, runs the vector query as soon as the
+# embedding arrives, fuses both rankings like HybridCypherRetriever and then
+# traverses from the winners. Per-step timings are returned in the result
+# metadata.
+#
+# Streamlit runs scripts synchronously, so run_async() executes coroutines on
+# one long-lived event loop in a background thread; the async driver and
+# client stay bound to that loop for the life of the process. The diagnosis
+# API awaits the same loop from its own with on_background_loop().
+
+import asyncio
+import threading
+import time
+
+from neo4j_graphrag.types import RetrieverResult
+
+from utils.graph_schema import EMBEDDING_MODEL, FULLTEXT_INDEX_NAME, VECTOR_INDEX_NAME
+from utils.hybrid_search import (
+    FULLTEXT_QUERY,
+    VECTOR_QUERY,
+    escape_lucene,
+    fuse_hits,
+    hit_params,
+    seeded_traversal_query,
+    to_retriever_result,
+)
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-retrieval", daemon=True).start()
+    return _loop
+
+
+def run_async(coro, timeout: float = None):
+    """Run a coroutine on the shared background event loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result(timeout)
+
+
+async def on_background_loop(coro):
+    """Await a coroutine that runs on the shared background loop, from another event loop (the API server's)."""
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, _background_loop()))
+
+
+class AsyncHybridRetriever:
+    """Hybrid search with the embedding, fulltext and vector steps overlapped."""
+
+    def __init__(self, driver, client, embedder, retrieval_query: str,
+                 vector_index_name: str = VECTOR_INDEX_NAME, fulltext_index_name: str = FULLTEXT_INDEX_NAME,
+                 model: str = EMBEDDING_MODEL, local_index=None, database=None):
+        self.driver = driver
+        self.client = client
+        self.embedder = embedder
+        self.retrieval_query = retrieval_query
+        self.vector_index_name = vector_index_name
+        self.fulltext_index_name = fulltext_index_name
+        self.model = model
+        self.local_index = local_index
+        self.database = database
+        self._traversal_query = seeded_traversal_query(retrieval_query)
+
+    async def embed(self, query_text: str) -> list:
+        # Reuse the app's query caches, but make the API call itself without blocking the loop
+        vector = self.embedder.lookup(query_text)
+        if vector is None:
+            response = await self.client.embeddings.create(model=self.model, input=[query_text])
+            vector = response.data[0].embedding
+            self.embedder.remember(query_text, vector)
+        return vector
+
+    async def vector_hits(self, query_vector: list, top_k: int) -> list:
+        if self.local_index is not None:
+            # Neo4j reports cosine vector scores as (1 + cos) / 2; keep the same scale
+            return [(node_id, (1 + score) / 2) for node_id, score in self.local_index.search(query_vector, top_k)]
+        records, _, _ = await self.driver.execute_query(
+            VECTOR_QUERY, index_name=self.vector_index_name, top_k=top_k, query_vector=query_vector,
+            database_=self.database,
+        )
+        return [(record["node_id"], record["score"]) for record in records]
+
+    async def fulltext_hits(self, query_text: str, top_k: int) -> list:
+        escaped = escape_lucene(query_text)
+        if not escaped:
+            return []
+        records, _, _ = await self.driver.execute_query(
+            FULLTEXT_QUERY, index_name=self.fulltext_index_name, query_text=escaped, top_k=top_k,
+            database_=self.database,
+        )
+        return [(record["node_id"], record["score"]) for record in records]
+
+    async def ranked_hits(self, query_text: str, top_k: int, timings: dict = None) -> list:
+        """Fused (node_id, score) ranking for one query, before traversal."""
+        timings = {} if timings is None else timings
+
+        async def timed(name, coro):
+            step_started = time.perf_counter()
+            result = await coro
+            timings[name] = round((time.perf_counter() - step_started) * 1000, 1)
+            return result
+
+        fulltext = asyncio.create_task(timed("fulltext_ms", self.fulltext_hits(query_text, top_k)))
+        try:
+            query_vector = await timed("embed_ms", self.embed(query_text))
+            vector_hits = await timed("vector_ms", self.vector_hits(query_vector, top_k))
+            fulltext_hits = await fulltext
+        except BaseException:
+            fulltext.cancel()
+            raise
+        return fuse_hits([vector_hits, fulltext_hits], top_k)
+
+    async def traverse(self, hits: list) -> list:
+        records, _, _ = await self.driver.execute_query(
+            self._traversal_query, hits=hit_params(hits), database_=self.database
+        )
+        return records
+
+    async def asearch(self, query_text: str, top_k: int = 5) -> RetrieverResult:
+        started = time.perf_counter()
+        timings = {}
+        winners = await self.ranked_hits(query_text, top_k, timings)
+        traversal_started = time.perf_counter()
+        records = await self.traverse(winners)
+        timings["traversal_ms"] = round((time.perf_counter() - traversal_started) * 1000, 1)
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return to_retriever_result(records, type(self).__name__, timings=timings)
+
+    def search(self, query_text: str, top_k: int = 5) -> RetrieverResult:
+        return run_async(self.asearch(query_text, top_k))
@@ -1,65 +1,188 @@
 import os
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
-from langdetect import detect
-from openai import OpenAI
+
+from utils.language_id import identify_language
 
 
 # Load environment variables from .env file
 env_path = Path(__file__).resolve().parents[2] / ".env"
 load_dotenv(dotenv_path=env_path)
 
-# Read API key from environment
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise RuntimeError("Missing required environment variable: OPENAI_API_KEY")
 
-client = OpenAI(api_key=openai_api_key)
+@lru_cache(maxsize=None)
+def get_client():
+    # Created on first use so importing this module does not load the OpenAI SDK
+    from openai import OpenAI
+
+    # Read API key from environment
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise RuntimeError("Missing required environment variable: OPENAI_API_KEY")
+    return OpenAI(api_key=openai_api_key)
 
 
 # Choose the model
 OPENAI_MODEL = "gpt-4o"
 
 def detect_language(text: str) -> str:
-    try:
-        lang_code = detect(text)
-    except Exception:
-        lang_code = "en"
-    return "nl" if lang_code.startswith("nl") else "en"
-
-def generate_answer_stream(messages_history: str, graph_context: str, user_lang: str) -> str:
-
-    #prompt for retriever behaviour and language (tuple)
-    system_msg = (
-        f"You are an assistant specialized in industrial maintenance and troubleshooting. "
-        f"Your role is to generate accurate, natural-language recommendations for technicians working with manufacturing equipment, particularly the Ion Beam Machine. "
-        f"You can see the full conversation history in this chat and should use it to answer follow-up questions. "
-        f"The user is currently speaking in {'Dutch' if user_lang == 'nl' else 'English'}, so respond in that language. "
-        f"Use the provided knowledge graph context for factual information when relevant, and clearly mark such content as [Graph]. "
-        f"Begin each response by briefly explaining any key concepts or entities from the user's question, especially if they relate to the Ion Beam Machine. "
-        f"Then, provide a complete answer that incorporates relevant information from the knowledge graph (if any). "
-        f"If the answer cannot be grounded in the graph, rely on your general knowledge and mark those parts as [LLM]. "
-        f"If the question is unrelated to the Ion Beam Machine or the graph content, answer based on [LLM] knowledge only."
-    )
+    # Deterministic nl/en lookup-table scorer, memoized per message
+    return identify_language(text)
+
+@lru_cache(maxsize=None)
+def get_async_client():
+    # For the diagnosis API; one client per worker process and event loop
+    from openai import AsyncOpenAI
+
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise RuntimeError("Missing required environment variable: OPENAI_API_KEY")
+    return AsyncOpenAI(api_key=openai_api_key)
+
 
-    # Add the system message up top
-    messages = [{"role": "system", "content": system_msg}]
+# Static instructions and few-shot guidance. Kept byte-identical across all
+# calls (nothing is interpolated) so it starts the prefix OpenAI's prompt cache
+# can reuse; everything that varies per question goes after the history.
+# Caching starts at 1024 prompt tokens, which this prefix plus the history of a
+# follow-up conversation reaches; the prompt is not padded to reach it sooner.
+SYSTEM_PROMPT = (
+    "You are an assistant specialized in industrial maintenance and troubleshooting. "
+    "Your role is to generate accurate, natural-language recommendations for technicians working with manufacturing equipment, particularly the Ion Beam Machine. "
+    "You can see the full conversation history in this chat and should use it to answer follow-up questions. "
+    "Each question is preceded by a turn context message that names the language the user is speaking (Dutch or English); respond in that language. "
+    "Use the provided knowledge graph context for factual information when relevant, and clearly mark such content as [Graph]. "
+    "Begin each response by briefly explaining any key concepts or entities from the user's question, especially if they relate to the Ion Beam Machine. "
+    "Then, provide a complete answer that incorporates relevant information from the knowledge graph (if any). "
+    "If the answer cannot be grounded in the graph, rely on your general knowledge and mark those parts as [LLM]. "
+    "If the question is unrelated to the Ion Beam Machine or the graph content, answer based on [LLM] knowledge only.\n\n"
+    "Example of the marking (made-up facts, format only):\n"
+    "[Graph] At the Filament, \"Filament starts slowly\" is caused by a worn filament; the recorded measure is to replace it.\n"
+    "[LLM] Also check the filament supply connections, since a poor contact gives the same symptom."
+)
 
-    # Inject the graph context *just before the latest user message*, not at the end
+
+def build_messages(messages_history: list, graph_context: str, user_lang: str) -> list:
+    """Chat messages with the byte-stable prefix first and the per-question parts last.
+
+    Layout: SYSTEM_PROMPT, then the conversation history (summary and earlier
+    turns, which only grow within a conversation), then one turn context
+    message with the answer language and graph context, then the question.
+    """
     *prior_messages, last_user = messages_history
-    messages.extend(prior_messages)
-    messages.append({"role": "system", "content": f"Graph context:\n{graph_context}"})
-    messages.append(last_user)
+    turn_context = (
+        f"Turn context\nLanguage: {'Dutch' if user_lang == 'nl' else 'English'}\n\n"
+        f"Graph context:\n{graph_context}"
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *prior_messages,
+        {"role": "system", "content": turn_context},
+        last_user,
+    ]
+
+
+class PromptUsage:
+    """Prompt and cached prompt token totals from the usage reported with each streamed answer."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.last = None
+
+    def record(self, usage) -> None:
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += usage.prompt_tokens
+            self.cached_tokens += cached
+            self.completion_tokens += usage.completion_tokens
+            self.last = {"prompt_tokens": usage.prompt_tokens, "cached_tokens": cached,
+                         "completion_tokens": usage.completion_tokens}
 
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+                "completion_tokens": self.completion_tokens,
+                "last": self.last,
+            }
+
+
+# Process-wide totals; see prompt_cache_stats()
+prompt_usage = PromptUsage()
+
+
+def prompt_cache_stats() -> dict:
+    return prompt_usage.stats()
+
+
+def generate_answer_stream(messages_history: list, graph_context: str, user_lang: str):
    # Streaming Response
-    response_stream = client.chat.completions.create(
+    response_stream = get_client().chat.completions.create(
         model=OPENAI_MODEL,
-        messages=messages,
-        stream=True
+        messages=build_messages(messages_history, graph_context, user_lang),
+        stream=True,
+        # The last chunk then carries the usage, including cached prompt tokens
+        stream_options={"include_usage": True},
     )
 
     # Yield content tokens as they are received
     for chunk in response_stream:
+        if chunk.usage is not None:
+            prompt_usage.record(chunk.usage)
+        if not chunk.choices:
+            continue
         content_chunk = chunk.choices[0].delta.content
         if content_chunk:
             yield content_chunk
+
+
+async def agenerate_answer_stream(messages_history: list, graph_context: str, user_lang: str):
+    """Async variant of generate_answer_stream; closing it early also closes the OpenAI stream."""
+    response_stream = await get_async_client().chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=build_messages(messages_history, graph_context, user_lang),
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    try:
+        async for chunk in response_stream:
+            if chunk.usage is not None:
+                prompt_usage.record(chunk.usage)
+            if not chunk.choices:
+                continue
+            content_chunk = chunk.choices[0].delta.content
+            if content_chunk:
+                yield content_chunk
+    finally:
+        await response_stream.close()
+
+
+def batched_stream(chunks, interval_seconds: float = None):
+    """Coalesce streamed tokens into pieces emitted at most every interval_seconds (STREAM_BATCH_MS)."""
+    if interval_seconds is None:
+        interval_seconds = float(os.getenv("STREAM_BATCH_MS") or 50) / 1000
+    buffer = []
+    flushed = time.monotonic()
+    for chunk in chunks:
+        buffer.append(chunk)
+        now = time.monotonic()
+        # The first token usually arrives after the interval, so it is still shown right away
+        if now - flushed >= interval_seconds:
+            yield "".join(buffer)
+            buffer.clear()
+            flushed = now
+    if buffer:
+        yield "".join(buffer)
@@ -0,0 +1,150 @@
+# Token-budgeted packing of retrieved graph context for the answer prompt
+#
+# Retriever items repeat the same location and symptom for every reason or
+# measure row. The packer merges them into one block per symptom (with all of
+# its locations, reasons and measures), adds blocks in order of their best
+# retrieval score until CONTEXT_TOKEN_BUDGET is reached (trimming the last
+# block's reason/measure lines if only part of it fits), and renders the kept
+# blocks grouped by location:
+#
+#   Location: Filament
+#     Symptom: Filament starts slowly
+#       Reason: ...
+#       Measure: ...
+#
+# Tokens are counted with tiktoken. Its BPE file is downloaded on first use
+# (or read from TIKTOKEN_CACHE_DIR); where that is not possible, e.g. on an
+# air-gapped network without the bundled file, counts fall back to an
+# estimate of CHARS_PER_TOKEN characters per token.
+
+import logging
+import math
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from utils.traversal_queries import metadata_entities
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = 1500
+DEFAULT_MODEL = "gpt-4o"
+# Rough average for English and Dutch text with the GPT-4o tokenizer
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """The tiktoken encoding for model, or None when it cannot be loaded."""
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        logger.warning(
+            "Cannot load the tiktoken encoding for %s; estimating %d characters per token. "
+            "Set TIKTOKEN_CACHE_DIR to a directory with the encoding file for exact counts.",
+            model, CHARS_PER_TOKEN, exc_info=True,
+        )
+        return None
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    symptoms: int
+    dropped: int
+
+
+@dataclass
+class _SymptomBlock:
+    symptom: str
+    score: float
+    locations: list
+    reasons: list
+    measures: list
+
+    def lines(self, reasons: int = None, measures: int = None) -> list:
+        lines = [f"  Symptom: {self.symptom}"] if self.symptom else []
+        lines += [f"    Reason: {reason}" for reason in self.reasons[:reasons]]
+        lines += [f"    Measure: {measure}" for measure in self.measures[:measures]]
+        return lines
+
+
+def _add_unique(values: list, new: list) -> None:
+    for value in new:
+        if value not in values:
+            values.append(value)
+
+
+def merge_items(items) -> list:
+    """One block per symptom (or bare location), best score first."""
+    blocks = {}
+    for index, item in enumerate(items):
+        meta = item.metadata
+        if not meta:
+            continue
+        entities = metadata_entities(meta)
+        locations = [text for _, text in entities["location"]]
+        symptom = next((text for _, text in entities["symptom"]), "")
+        if not symptom and not locations:
+            continue
+        # Items arrive in score order, so fall back to their position when no score is given
+        score = meta.get("score")
+        score = float(score) if score is not None else -index
+        key = symptom or ("location", tuple(locations))
+        block = blocks.setdefault(key, _SymptomBlock(symptom, score, [], [], []))
+        block.score = max(block.score, score)
+        _add_unique(block.locations, locations)
+        _add_unique(block.reasons, [text for _, text in entities["reason"]])
+        _add_unique(block.measures, [text for _, text in entities["measure"]])
+    return sorted(blocks.values(), key=lambda block: block.score, reverse=True)
+
+
+def _render(blocks: list) -> str:
+    # Group by location in the order locations first appear among the kept blocks
+    groups = {}
+    for block, lines in blocks:
+        groups.setdefault(_header(block), []).extend(lines)
+    return "\n".join("\n".join([*header, *lines]) for header, lines in groups.items())
+
+
+def _header(block: _SymptomBlock) -> tuple:
+    return (f"Location: {', '.join(block.locations)}",) if block.locations else ()
+
+
+def pack_context(items, budget: int = None, model: str = DEFAULT_MODEL) -> PackedContext:
+    """Deduplicate and group retriever items into a context string of at most `budget` tokens."""
+    budget = budget or int(os.getenv("CONTEXT_TOKEN_BUDGET") or DEFAULT_TOKEN_BUDGET)
+    blocks = merge_items(items)
+    kept = []
+    used = 0
+    for block in blocks:
+        # Longest prefix of the block that still fits: all lines, then fewer
+        # measures, then fewer reasons, down to the bare symptom
+        candidates = [
+            (len(block.reasons), measures) for measures in range(len(block.measures), -1, -1)
+        ] + [(reasons, 0) for reasons in range(len(block.reasons) - 1, -1, -1)]
+        for reasons, measures in candidates:
+            lines = block.lines(reasons, measures)
+            cost = count_tokens("\n".join([*_header(block), *lines]) + "\n", model)
+            if used + cost <= budget:
+                kept.append((block, lines))
+                used += cost
+                break
+
+    text = _render(kept)
+    return PackedContext(
+        text=text,
+        tokens=count_tokens(text, model) if text else 0,
+        symptoms=len(kept),
+        dropped=len(blocks) - len(kept),
+    )
@@ -0,0 +1,260 @@
+# Persistent conversation store for the app
+#
+# Conversations and messages live in an embedded SQLite file instead of
+# st.session_state, so they survive a restart of the app and a session only
+# holds ids and the messages it is currently showing. The graph context of an
+# answer is stored as references: the answer row lists the element ids of the
+# graph nodes it used and its links as index pairs into that list, while the
+# node texts are stored once in a shared context_nodes table. Those rows are
+# keyed on a hash of element id, kind and text and never rewritten: Neo4j can
+# reuse element ids after a delete or re-import, and an older answer must keep
+# showing the node it was given. Graph data, Cypher query and entities table
+# are rebuilt from those references when a context panel is opened.
+#
+# Conversations belong to a session key (the ?session= URL parameter in the
+# app), so reopening the same URL brings the conversations back.
+#
+# Each conversation can also have a rolling summary of its older turns (see
+# utils/history_manager.py), stored with the id of the last message it covers.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from utils.traversal_queries import ENTITY_LABELS
+
+DEFAULT_STORE_PATH = Path(__file__).resolve().parents[2] / ".cache" / "conversations.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY, session TEXT NOT NULL, title TEXT NOT NULL, created REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS conversations_session ON conversations(session, id);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY, conversation_id INTEGER NOT NULL, role TEXT NOT NULL,
+    content TEXT NOT NULL, lang TEXT, created REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS messages_conversation ON messages(conversation_id, role, id);
+-- nodes is only read for answers stored before context_nodes existed
+CREATE TABLE IF NOT EXISTS nodes (
+    element_id TEXT PRIMARY KEY, kind TEXT NOT NULL, text TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS context_nodes (
+    node_key TEXT PRIMARY KEY, element_id TEXT NOT NULL, kind TEXT NOT NULL, text TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS answer_context (
+    message_id INTEGER PRIMARY KEY, node_ids TEXT NOT NULL, links TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS summaries (
+    conversation_id INTEGER PRIMARY KEY, summary TEXT NOT NULL, covered_until INTEGER NOT NULL);
+"""
+
+_SQL_BATCH = 500
+
+
+def node_key(node: dict) -> str:
+    """Content key of a context node: the same element id with other text is another row."""
+    raw = f"{node['id']}\0{node['type']}\0{node['label']}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def context_cypher(node_ids: list) -> str:
+    """Cypher that shows the given nodes and the relationships between them in Neo4j Browser."""
+    id_list_str = ", ".join(f"'{node_id}'" for node_id in node_ids)
+    return f"""
+        MATCH (n)
+        WHERE elementId(n) IN [{id_list_str}]
+        OPTIONAL MATCH (n)-[r]->(m)
+        WHERE elementId(m) IN [{id_list_str}]
+        RETURN n, r, m
+        """
+
+
+class ConversationStore:
+    """SQLite-backed conversations, messages and node-id references to answer context."""
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv("CONVERSATION_DB_PATH") or DEFAULT_STORE_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # One connection shared by all Streamlit session threads
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # -- conversations ------------------------------------------------------
+
+    def create_conversation(self, session: str, title: str = None) -> int:
+        with self._lock:
+            if title is None:
+                count = self._conn.execute(
+                    "SELECT count(*) FROM conversations WHERE session = ?", (session,)
+                ).fetchone()[0]
+                title = f"Conversation {count + 1}"
+            return self._conn.execute(
+                "INSERT INTO conversations (session, title, created) VALUES (?, ?, ?)",
+                (session, title, time.time()),
+            ).lastrowid
+
+    def conversations(self, session: str) -> list:
+        """(id, title) of the session's conversations, oldest first."""
+        rows = self._query("SELECT id, title FROM conversations WHERE session = ? ORDER BY id", (session,))
+        return [(row["id"], row["title"]) for row in rows]
+
+    # -- messages -----------------------------------------------------------
+
+    def add_message(self, conversation_id: int, role: str, content: str, lang: str = None) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO messages (conversation_id, role, content, lang, created) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, role, content, lang, time.time()),
+            ).lastrowid
+
+    def add_answer(self, conversation_id: int, content: str, nodes: list = (), links: list = ()) -> int:
+        """Store an assistant message and, if any, the graph nodes and links it was grounded on."""
+        node_ids = [node["id"] for node in nodes]
+        node_keys = [node_key(node) for node in nodes]
+        position = {node_id: index for index, node_id in enumerate(node_ids)}
+        compact_links = [
+            [position[link["source"]], position[link["target"]], link["type"]]
+            for link in links
+            if link["source"] in position and link["target"] in position
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                message_id = self._conn.execute(
+                    "INSERT INTO messages (conversation_id, role, content, lang, created) VALUES (?, 'assistant', ?, NULL, ?)",
+                    (conversation_id, content, time.time()),
+                ).lastrowid
+                if node_ids:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO context_nodes (node_key, element_id, kind, text) VALUES (?, ?, ?, ?)",
+                        [(key, node["id"], node["type"], node["label"]) for key, node in zip(node_keys, nodes)],
+                    )
+                    self._conn.execute(
+                        "INSERT INTO answer_context (message_id, node_ids, links) VALUES (?, ?, ?)",
+                        (message_id, json.dumps(node_keys), json.dumps(compact_links, separators=(",", ":"))),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return message_id
+
+    def count_questions(self, conversation_id: int) -> int:
+        return self._query(
+            "SELECT count(*) FROM messages WHERE conversation_id = ? AND role = 'user'", (conversation_id,)
+        )[0][0]
+
+    def messages_after(self, conversation_id: int, after_id: int = 0) -> list:
+        """Messages with an id above after_id as {"id", "role", "content"} dicts, oldest first."""
+        rows = self._query(
+            "SELECT id, role, content FROM messages WHERE conversation_id = ? AND id > ? ORDER BY id",
+            (conversation_id, after_id),
+        )
+        return [{"id": row["id"], "role": row["role"], "content": row["content"]} for row in rows]
+
+    def recent_pairs(self, conversation_id: int, limit: int) -> tuple:
+        """The last `limit` question/answer pairs and the number of older pairs not loaded.
+
+        Pairs are (question, answer) message dicts with "id", "content" and
+        "lang"; answer is None for a question that did not get one.
+        """
+        total = self.count_questions(conversation_id)
+        if not total or limit <= 0:
+            return [], total
+        rows = self._query(
+            "SELECT id, role, content, lang FROM messages WHERE conversation_id = ? AND id >= ("
+            "  SELECT min(id) FROM (SELECT id FROM messages WHERE conversation_id = ? AND role = 'user'"
+            "  ORDER BY id DESC LIMIT ?)"
+            ") ORDER BY id",
+            (conversation_id, conversation_id, limit),
+        )
+        pairs = []
+        for row in rows:
+            message = {"id": row["id"], "content": row["content"], "lang": row["lang"]}
+            if row["role"] == "user":
+                pairs.append((message, None))
+            elif pairs and pairs[-1][1] is None:
+                pairs[-1] = (pairs[-1][0], message)
+        return pairs, max(total - limit, 0)
+
+    # -- rolling summaries --------------------------------------------------
+
+    def summary(self, conversation_id: int) -> tuple:
+        """(summary text, id of the last message it covers); ("", 0) if there is none yet."""
+        rows = self._query(
+            "SELECT summary, covered_until FROM summaries WHERE conversation_id = ?", (conversation_id,)
+        )
+        return (rows[0]["summary"], rows[0]["covered_until"]) if rows else ("", 0)
+
+    def save_summary(self, conversation_id: int, summary: str, covered_until: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (conversation_id, summary, covered_until) VALUES (?, ?, ?)",
+                (conversation_id, summary, covered_until),
+            )
+
+    # -- answer context -----------------------------------------------------
+
+    def answer_context(self, message_id: int) -> dict:
+        """graph_data, cypher_query and table_rows of an answer, rebuilt from its node references."""
+        rows = self._query("SELECT node_ids, links FROM answer_context WHERE message_id = ?", (message_id,))
+        if not rows:
+            return {"graph_data": {"nodes": [], "links": []}, "cypher_query": "", "table_rows": []}
+        refs = json.loads(rows[0]["node_ids"])
+        links = json.loads(rows[0]["links"])
+        # ref -> (element id, kind, text)
+        found = self._lookup_nodes(
+            "SELECT node_key AS ref, element_id, kind, text FROM context_nodes WHERE node_key IN ({})", refs
+        )
+        missing = [ref for ref in refs if ref not in found]
+        if missing:
+            # Answers stored before context_nodes reference element ids in the old nodes table
+            found.update(self._lookup_nodes(
+                "SELECT element_id AS ref, element_id, kind, text FROM nodes WHERE element_id IN ({})", missing
+            ))
+        node_ids = [found[ref][0] if ref in found else ref for ref in refs]
+
+        nodes = [
+            {"id": found[ref][0], "label": found[ref][2], "type": found[ref][1]}
+            for ref in refs
+            if ref in found
+        ]
+        entity_names = dict(ENTITY_LABELS)
+        table_rows = []
+        seen = set()
+        for node in nodes:
+            row_key = (entity_names.get(node["type"], node["type"]), node["label"])
+            if row_key not in seen:
+                seen.add(row_key)
+                table_rows.append({"Entity": row_key[0], "Remarks": row_key[1]})
+        return {
+            "graph_data": {
+                "nodes": nodes,
+                "links": [
+                    {"source": node_ids[source], "target": node_ids[target], "type": rel_type}
+                    for source, target, rel_type in links
+                ],
+            },
+            "cypher_query": context_cypher(node_ids),
+            "table_rows": table_rows,
+        }
+
+    def _lookup_nodes(self, sql: str, refs: list) -> dict:
+        found = {}
+        for start in range(0, len(refs), _SQL_BATCH):
+            chunk = refs[start:start + _SQL_BATCH]
+            for row in self._query(sql.format(",".join("?" * len(chunk))), chunk):
+                found[row["ref"]] = (row["element_id"], row["kind"], row["text"])
+        return found
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
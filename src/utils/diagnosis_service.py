@@ -0,0 +1,145 @@
+# Retrieve -> generate pipeline shared by the Streamlit app and the diagnosis API
+#
+# prepare() detects the language and runs the hybrid search concurrently, then
+# turns the retrieved items into graph data (nodes by element id and the
+# links between them) and into the packed prompt context. The answer is
+# streamed with stream_answer() (synchronous, for Streamlit) or
+# astream_answer() (async, for the API). An answer counts as grounded in the
+# graph when it contains the [Graph] marker the system prompt asks for;
+# answer_graph() returns the nodes and links to show or store only then.
+#
+# prepare() must run on the event loop the retriever's async driver is bound
+# to: run_async(prepare(...)) from synchronous code, or
+# on_background_loop(prepare(...)) from another event loop.
+#
+# Identical questions that are in flight at the same time share work
+# (COALESCE_REQUESTS, on by default): one retrieval per normalized question,
+# and for opening questions (no history) one answer stream fanned out to
+# every asker, keyed on the question, language and packed context.
+# coalescing_stats() reports how many calls that saved.
+
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass, field
+
+from utils.chatbot_service import agenerate_answer_stream, detect_language, generate_answer_stream
+from utils.context_packing import pack_context
+from utils.embedding_cache import normalize_query
+from utils.single_flight import SingleFlight, StreamFanOut
+from utils.traversal_queries import ENTITY_LABELS, metadata_entities
+
+NO_CONTEXT = "(No direct graph context found; relying on general knowledge.)"
+GRAPH_MARKER = "[Graph]"
+
+# (entity kind, relationship type) of the links drawn from each symptom
+_SYMPTOM_LINKS = (("location", "HAS_FAULT"), ("reason", "CAUSED_BY"), ("measure", "MITIGATED_BY"))
+
+# Retrievals run on the one background loop, so one SingleFlight covers all callers
+_retrievals = SingleFlight()
+_answers = StreamFanOut()
+
+
+def coalescing_enabled() -> bool:
+    return os.getenv("COALESCE_REQUESTS", "true").strip().lower() not in ("0", "false", "no")
+
+
+def coalescing_stats() -> dict:
+    """Upstream calls made and calls saved by sharing in-flight retrievals and answer streams."""
+    return {"retrievals": _retrievals.stats(), "answers": _answers.stats()}
+
+
+@dataclass
+class Diagnosis:
+    """Everything needed to generate, show and store one answer."""
+
+    question: str
+    lang: str
+    context: str
+    messages: list
+    nodes: dict = field(default_factory=dict)
+    links: list = field(default_factory=list)
+
+    @property
+    def graph_found(self) -> bool:
+        return bool(self.nodes)
+
+
+def graph_elements(items) -> tuple:
+    """Graph nodes ({element id: {"id", "label", "type"}}) and symptom links from retriever items."""
+    nodes = {}
+    links = []
+    for item in items:
+        meta = item.metadata
+        if not meta:
+            continue
+
+        # Lists of (id, text) per kind; one entry each for the row traversal,
+        # several for the aggregated one
+        entities = metadata_entities(meta)
+        for kind, _ in ENTITY_LABELS:
+            for node_id, text in entities[kind]:
+                if node_id:
+                    nodes[node_id] = {"id": node_id, "label": text, "type": kind}
+        for symptom_id, _ in entities["symptom"]:
+            if not symptom_id:
+                continue
+            for kind, rel_type in _SYMPTOM_LINKS:
+                for node_id, _ in entities[kind]:
+                    if node_id:
+                        source, target = (node_id, symptom_id) if kind == "location" else (symptom_id, node_id)
+                        links.append({"source": source, "target": target, "type": rel_type})
+    return nodes, links
+
+
+async def prepare(retriever, question: str, history: list = (), top_k: int = 2) -> Diagnosis:
+    """Retrieve graph context for a question; history is the earlier {"role", "content"} messages."""
+    def search():
+        return retriever.asearch(query_text=question, top_k=top_k)
+
+    if coalescing_enabled():
+        retrieval = _retrievals.run((normalize_query(question), top_k), search)
+    else:
+        retrieval = search()
+    # Language detection, embedding, fulltext and vector search run concurrently
+    lang, retriever_result = await asyncio.gather(asyncio.to_thread(detect_language, question), retrieval)
+    nodes, links = graph_elements(retriever_result.items)
+    # Deduplicated, grouped by location and cut to CONTEXT_TOKEN_BUDGET in score order
+    context = pack_context(retriever_result.items).text or NO_CONTEXT
+    messages = [*history, {"role": "user", "content": question}]
+    return Diagnosis(question=question, lang=lang, context=context, messages=messages, nodes=nodes, links=links)
+
+
+def _answer_key(diagnosis: Diagnosis):
+    """Fan-out key for an opening question; None when the answer depends on conversation history."""
+    if len(diagnosis.messages) > 1 or not coalescing_enabled():
+        return None
+    context_hash = hashlib.sha256(diagnosis.context.encode("utf-8")).hexdigest()
+    return normalize_query(diagnosis.question), diagnosis.lang, context_hash
+
+
+def stream_answer(diagnosis: Diagnosis):
+    def start():
+        return generate_answer_stream(diagnosis.messages, diagnosis.context, diagnosis.lang)
+
+    key = _answer_key(diagnosis)
+    return start() if key is None else _answers.stream(key, start)
+
+
+def astream_answer(diagnosis: Diagnosis):
+    def start():
+        return agenerate_answer_stream(diagnosis.messages, diagnosis.context, diagnosis.lang)
+
+    key = _answer_key(diagnosis)
+    return start() if key is None else _answers.astream(key, start)
+
+
+def uses_graph(answer: str) -> bool:
+    return GRAPH_MARKER in answer
+
+
+def answer_graph(diagnosis: Diagnosis, answer: str) -> tuple:
+    """(nodes, links) the answer was grounded on; empty unless it used the graph context."""
+    if diagnosis.graph_found and uses_graph(answer):
+        return list(diagnosis.nodes.values()), diagnosis.links
+    return [], []
@@ -0,0 +1,252 @@
+# Embedding caches
+#
+# EmbeddingCache keeps vectors in a local SQLite file keyed by sha256(model
+# name, normalized text), so the embedding job and the retriever share them
+# across graph rebuilds and app restarts. The least recently used rows are
+# evicted once the stored vectors exceed a size budget.
+#
+# LRUQueryEmbedder sits in front of that for the app: a small in-process LRU of
+# recent question vectors, keyed on a looser normalization (case, whitespace
+# and punctuation) so a resubmitted or lightly edited question never leaves
+# the process.
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+from neo4j_graphrag.embeddings.base import Embedder
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[2] / ".cache" / "embeddings.sqlite3"
+DEFAULT_MAX_MB = 512
+DEFAULT_QUERY_CACHE_SIZE = 1024
+
+# SQLite limits the number of host parameters per statement
+_SQL_BATCH = 500
+# put_many calls between re-reads of the stored size, which other processes may change
+_RESYNC_PUTS = 256
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def normalize_query(text: str) -> str:
+    # Drop punctuation and case so "Filament start traag?" and "filament start traag" share a vector
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return normalize_text(text).casefold()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed vector store with size-based LRU eviction and hit-rate counters."""
+
+    def __init__(self, path=None, max_bytes: int = None):
+        self.path = Path(path or os.getenv("EMBEDDING_CACHE_PATH") or DEFAULT_CACHE_PATH)
+        self.max_bytes = max_bytes or int(os.getenv("EMBEDDING_CACHE_MAX_MB") or DEFAULT_MAX_MB) * 1024 * 1024
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        # WAL lets the app and the embedding job use the same file concurrently
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        # Running total of the stored vector sizes, kept up to date on insert and evict
+        self._bytes = self._stored_bytes()
+        self._puts = 0
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT coalesce(sum(size), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, texts: list) -> list:
+        """Return one vector per text, or None where the text is not cached."""
+        keys = [cache_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                chunk = keys[start:start + _SQL_BATCH]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", chunk
+                ).fetchall()
+                found.update(rows)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [time.time(), *(key for key, _ in rows)],
+                    )
+            hits = sum(key in found for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return [_decode(found[key]) if key in found else None for key in keys]
+
+    def get(self, model: str, text: str):
+        return self.get_many(model, [text])[0]
+
+    def put_many(self, model: str, texts: list, vectors: list) -> None:
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = array("f", vector).tobytes()
+            rows.append((cache_key(model, text), model, blob, len(blob), now))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for row in rows:
+                    if self._conn.execute(
+                        "INSERT OR IGNORE INTO embeddings (key, model, vector, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                        row,
+                    ).rowcount:
+                        self._bytes += row[3]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._puts += 1
+            # The embedding job and the app share the file, so the running total is
+            # re-read now and then, and before evicting on its word
+            if self._puts % _RESYNC_PUTS == 0 or self._bytes > self.max_bytes:
+                self._bytes = self._stored_bytes()
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def put(self, model: str, text: str, vector: list) -> None:
+        self.put_many(model, [text], [vector])
+
+    def _evict(self) -> None:
+        # Drop least recently used rows until the cache is back under 90% of its budget
+        target = int(self.max_bytes * 0.9)
+        while self._bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_used LIMIT ?", (_SQL_BATCH,)
+            ).fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            victims = []
+            for key, size in rows:
+                victims.append(key)
+                self._bytes -= size
+                if self._bytes <= target:
+                    break
+            self._conn.execute(
+                f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(victims))})", victims
+            )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self._bytes,
+        }
+
+
+def _decode(blob: bytes) -> list:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class CachedEmbedder(Embedder):
+    """Embedder wrapper that consults the persistent cache before calling the wrapped embedder."""
+
+    def __init__(self, embedder: Embedder, model: str, cache: EmbeddingCache):
+        super().__init__()
+        self.embedder = embedder
+        self.model = model
+        self.cache = cache
+
+    def embed_query(self, text: str) -> list:
+        vector = self.lookup(text)
+        if vector is None:
+            vector = self.embedder.embed_query(text)
+            self.remember(text, vector)
+        return vector
+
+    # lookup/remember let async callers use the cache around their own API call
+    def lookup(self, text: str):
+        return self.cache.get(self.model, text)
+
+    def remember(self, text: str, vector: list) -> None:
+        self.cache.put(self.model, text, vector)
+
+
+class LRUQueryEmbedder(Embedder):
+    """Thread-safe, bounded LRU of recent query vectors in front of another embedder."""
+
+    def __init__(self, embedder: Embedder, maxsize: int = None):
+        super().__init__()
+        self.embedder = embedder
+        self.maxsize = maxsize or int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE") or DEFAULT_QUERY_CACHE_SIZE)
+        self.hits = 0
+        self.misses = 0
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_query(self, text: str) -> list:
+        vector = self._get(text)
+        if vector is None:
+            # Embed outside the lock so one slow request does not block other sessions
+            vector = self.embedder.embed_query(text)
+            self._put(text, vector)
+        return vector
+
+    def lookup(self, text: str):
+        """Return a cached vector from this LRU or the wrapped embedder's cache, without embedding."""
+        vector = self._get(text)
+        if vector is None and hasattr(self.embedder, "lookup"):
+            vector = self.embedder.lookup(text)
+            if vector is not None:
+                self._put(text, vector)
+        return vector
+
+    def remember(self, text: str, vector: list) -> None:
+        self._put(text, vector)
+        if hasattr(self.embedder, "remember"):
+            self.embedder.remember(text, vector)
+
+    def _get(self, text: str):
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is not None:
+                self._vectors.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+        return None
+
+    def _put(self, text: str, vector: list) -> None:
+        key = normalize_query(text)
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.maxsize:
+                self._vectors.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._vectors),
+        }
@@ -0,0 +1,245 @@
+# Batched, concurrent embedding of the TextChunk nodes
+#
+# Texts are sent to the OpenAI embeddings endpoint in large batches with several
+# requests in flight under a requests/tokens-per-minute budget, and vectors are
+# written back to Neo4j in chunks as the batches complete.
+#
+# Each node stores a hash of (model, normalized text) next to its embedding. By
+# default only nodes whose hash is missing or stale are re-embedded, so a small
+# import refreshes the index in seconds; pass --full to re-embed everything.
+#
+# Usage (from the src/ directory):
+#   python -m utils.embedding_job --batch-size 256 --max-in-flight 4
+
+import argparse
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+import tiktoken
+from openai import OpenAI
+
+from utils.embedding_cache import EmbeddingCache, cache_key
+from utils.graph_schema import EMBEDDING_MODEL, EMBEDDING_PROPERTY, bump_graph_version
+from utils.neo4j_connection import create_driver, require_env
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_IN_FLIGHT = 4
+DEFAULT_WRITE_CHUNK_SIZE = 1000
+DEFAULT_REQUESTS_PER_MINUTE = 3000
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+
+SELECT_QUERY = """
+MATCH (n:TextChunk)
+WHERE (n:FaultSymptom AND n.description IS NOT NULL)
+   OR (n:FaultMeasure AND n.description IS NOT NULL)
+   OR (n:FaultReason AND n.name IS NOT NULL)
+   OR (n:FaultLocation AND n.name IS NOT NULL)
+RETURN elementId(n) AS node_id,
+       CASE
+         WHEN n:FaultSymptom THEN n.description
+         WHEN n:FaultMeasure THEN n.description
+         WHEN n:FaultReason THEN n.name
+         WHEN n:FaultLocation THEN n.name
+       END AS content,
+       n.embedding IS NOT NULL AS has_embedding,
+       n.embedding_hash AS embedding_hash
+"""
+
+WRITE_QUERY = """
+UNWIND $rows AS row
+MATCH (n) WHERE elementId(n) = row.id
+SET n.embedding_hash = row.hash
+WITH n, row
+CALL db.create.setNodeVectorProperty(n, $embedding_property, row.embedding)
+RETURN count(n) AS written
+"""
+
+
+@dataclass
+class EmbeddingStats:
+    nodes: int = 0
+    cache_hits: int = 0
+    batches: int = 0
+    prompt_tokens: int = 0
+    seconds: float = 0.0
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"Embedded {self.nodes} nodes in {self.batches} batches in {self.seconds:.2f}s "
+            f"-> {self.nodes_per_second:.1f} nodes/s, {self.cache_hits} from cache, "
+            f"{self.prompt_tokens} tokens used"
+        )
+
+
+class RateLimiter:
+    """Blocking token-bucket limiter for requests and tokens per minute, shared by worker threads."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self.available = [float(requests_per_minute), float(tokens_per_minute)]
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        # A single batch larger than the whole per-minute budget still has to go through
+        cost = (1, min(tokens, self.limits[1]))
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed, self.updated = now - self.updated, now
+                for i, limit in enumerate(self.limits):
+                    self.available[i] = min(limit, self.available[i] + elapsed * limit / 60)
+                shortfall = max((cost[i] - self.available[i]) * 60 / self.limits[i] for i in range(2))
+                if shortfall <= 0:
+                    for i in range(2):
+                        self.available[i] -= cost[i]
+                    return
+            time.sleep(shortfall)
+
+
+def fetch_nodes(driver, model: str = EMBEDDING_MODEL, incremental: bool = True, database=None) -> list:
+    """Return (node_id, text) pairs to embed; with incremental, only nodes whose text hash is missing or stale."""
+    records, _, _ = driver.execute_query(SELECT_QUERY, database_=database)
+    nodes = []
+    for record in records:
+        text = record["content"]
+        # Safety check in case of empty texts
+        if not text or not text.strip():
+            continue
+        if incremental and record["has_embedding"] and record["embedding_hash"] == cache_key(model, text):
+            continue
+        nodes.append((str(record["node_id"]), text))
+    return nodes
+
+
+def _batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def embed_nodes(
+    driver,
+    nodes: list,
+    client=None,
+    model: str = EMBEDDING_MODEL,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    write_chunk_size: int = DEFAULT_WRITE_CHUNK_SIZE,
+    requests_per_minute: int = DEFAULT_REQUESTS_PER_MINUTE,
+    tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+    cache: EmbeddingCache = None,
+    database=None,
+) -> EmbeddingStats:
+    """Embed (node_id, text) pairs and write the vectors and text hashes onto the nodes."""
+    client = client or OpenAI(max_retries=5)
+    encoding = tiktoken.encoding_for_model(model)
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    stats = EmbeddingStats()
+    started = time.perf_counter()
+
+    def embed_batch(batch):
+        texts = [text for _, text in batch]
+        limiter.acquire(sum(len(tokens) for tokens in encoding.encode_batch(texts)))
+        response = client.embeddings.create(model=model, input=texts)
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        if cache is not None:
+            cache.put_many(model, texts, vectors)
+        return batch, vectors, response.usage.prompt_tokens
+
+    pending_rows = []
+
+    def flush():
+        driver.execute_query(
+            WRITE_QUERY, rows=pending_rows, embedding_property=EMBEDDING_PROPERTY, database_=database
+        )
+        pending_rows.clear()
+
+    def add(node_id, text, vector):
+        pending_rows.append({"id": node_id, "hash": cache_key(model, text), "embedding": vector})
+        if len(pending_rows) >= write_chunk_size:
+            flush()
+
+    if cache is not None:
+        # Texts embedded by an earlier run skip the API entirely
+        cached = cache.get_many(model, [text for _, text in nodes])
+        misses = []
+        for (node_id, text), vector in zip(nodes, cached):
+            if vector is None:
+                misses.append((node_id, text))
+            else:
+                add(node_id, text, vector)
+        stats.cache_hits = len(nodes) - len(misses)
+        stats.nodes += stats.cache_hits
+        nodes = misses
+
+    batches = _batches(nodes, batch_size)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        in_flight = set()
+        while True:
+            # Keep at most max_in_flight requests outstanding so memory stays bounded
+            for batch in batches:
+                in_flight.add(pool.submit(embed_batch, batch))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch, vectors, tokens = future.result()
+                for (node_id, text), vector in zip(batch, vectors):
+                    add(node_id, text, vector)
+                stats.nodes += len(batch)
+                stats.batches += 1
+                stats.prompt_tokens += tokens
+    if pending_rows:
+        flush()
+    if stats.nodes:
+        # New vectors change vector search results, so cached retrievals are stale
+        bump_graph_version(driver, database)
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Compute and upsert embeddings for all TextChunk nodes.")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--write-chunk-size", type=int, default=DEFAULT_WRITE_CHUNK_SIZE)
+    parser.add_argument("--requests-per-minute", type=int, default=DEFAULT_REQUESTS_PER_MINUTE)
+    parser.add_argument("--tokens-per-minute", type=int, default=DEFAULT_TOKENS_PER_MINUTE)
+    parser.add_argument("--no-cache", action="store_true", help="bypass the local embedding cache")
+    parser.add_argument("--full", action="store_true",
+                        help="re-embed every node instead of only new or changed ones")
+    args = parser.parse_args(argv)
+
+    require_env("OPENAI_API_KEY")
+    driver = create_driver()
+    try:
+        nodes = fetch_nodes(driver, model=args.model, incremental=not args.full)
+        print(f"Found {len(nodes)} {'' if args.full else 'new or changed '}nodes to embed.")
+        stats = embed_nodes(
+            driver,
+            nodes,
+            model=args.model,
+            batch_size=args.batch_size,
+            max_in_flight=args.max_in_flight,
+            write_chunk_size=args.write_chunk_size,
+            requests_per_minute=args.requests_per_minute,
+            tokens_per_minute=args.tokens_per_minute,
+            cache=None if args.no_cache else EmbeddingCache(),
+        )
+    finally:
+        driver.close()
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# Bulk import of extracted FaultReport records into Neo4j
+#
+# Records are flattened into one parameter list per entity type and written with
+# a handful of UNWIND ... MERGE statements per chunk, instead of one tx.run per
+# symptom, symptom x reason and symptom x measure pair.
+#
+# Case and manual-book provenance is written in the same pass as the entities,
+# as (:Case) and (:Source) nodes linked from every entity a record mentions. A
+# new case therefore adds one relationship to a hot node such as a common
+# location instead of rewriting a growing case_ids list on it.
+#
+# Usage (from the src/ directory):
+#   python -m utils.graph_loader data/processed/baml_extracted_20_cases.json ...
+#   python -m utils.graph_loader --migrate-provenance    (existing graph only)
+
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from itertools import islice
+
+from utils.graph_schema import bump_graph_version, ensure_schema
+from utils.neo4j_connection import create_driver
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _provenance(var: str) -> str:
+    # Every entity row carries the case ids and source images of the records that mention it
+    return f"""
+FOREACH (case_id IN row.case_ids |
+    MERGE (c:Case {{case_id: case_id}})
+    MERGE ({var})-[:REPORTED_IN]->(c))
+FOREACH (image IN row.sources |
+    MERGE (s:Source {{image: image}})
+    MERGE ({var})-[:DOCUMENTED_IN]->(s))"""
+
+
+LOCATION_QUERY = """
+UNWIND $rows AS row
+MERGE (fl:FaultLocation {name: row.name})
+ON CREATE SET fl:TextChunk""" + _provenance("fl") + """
+WITH fl, row
+WHERE size(row.machines) > 0
+SET fl.machines = coalesce(fl.machines, [])
+    + [m IN row.machines WHERE NOT m IN coalesce(fl.machines, [])]
+"""
+
+SYMPTOM_QUERY = """
+UNWIND $rows AS row
+MERGE (fs:FaultSymptom {description: row.description})
+ON CREATE SET fs:TextChunk""" + _provenance("fs") + """
+WITH fs, row
+UNWIND row.locations AS loc_name
+MATCH (fl:FaultLocation {name: loc_name})
+MERGE (fl)-[:HAS_FAULT]->(fs)
+"""
+
+REASON_QUERY = """
+UNWIND $rows AS row
+MERGE (fr:FaultReason {name: row.name})
+ON CREATE SET fr:TextChunk""" + _provenance("fr") + """
+WITH fr, row
+UNWIND row.symptoms AS symptom
+MATCH (fs:FaultSymptom {description: symptom})
+MERGE (fs)-[:CAUSED_BY]->(fr)
+"""
+
+MEASURE_QUERY = """
+UNWIND $rows AS row
+MERGE (fm:FaultMeasure {description: row.description})
+ON CREATE SET fm:TextChunk""" + _provenance("fm") + """
+WITH fm, row
+UNWIND row.links AS link
+MATCH (fs:FaultSymptom {description: link.symptom})
+MERGE (fs)-[r:MITIGATED_BY]->(fm)
+SET r.resolution_status = link.status
+"""
+
+# One-off conversion of graphs imported with the old case_ids / source_image properties
+MIGRATE_PROVENANCE_QUERY = """
+MATCH (n)
+WHERE n.case_ids IS NOT NULL OR n.source_image IS NOT NULL
+FOREACH (case_id IN coalesce(n.case_ids, []) |
+    MERGE (c:Case {case_id: case_id})
+    MERGE (n)-[:REPORTED_IN]->(c))
+FOREACH (image IN CASE WHEN n.source_image IS NULL THEN [] ELSE [n.source_image] END |
+    MERGE (s:Source {image: image})
+    MERGE (n)-[:DOCUMENTED_IN]->(s))
+REMOVE n.case_ids, n.source_image
+RETURN count(n) AS migrated
+"""
+
+
+@dataclass
+class LoadStats:
+    records: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"Loaded {self.records} records in {self.chunks} chunks "
+            f"({self.skipped} skipped) in {self.seconds:.2f}s "
+            f"-> {self.records_per_second:.1f} records/s"
+        )
+
+
+def as_report_dict(entry):
+    """Return the plain FaultReport dict for a BAML model, a {"result": ...} wrapper or a flat dict."""
+    if hasattr(entry, "model_dump"):
+        return entry.model_dump(mode="json")
+    if isinstance(entry, dict) and isinstance(entry.get("result"), dict):
+        # The case id sits next to the wrapped result, not inside it
+        return {**entry["result"], "case_id": entry.get("case_id")}
+    return entry
+
+
+def _entity_row(rows: dict, key: str, provenance: tuple, **fields) -> dict:
+    row = rows.get(key)
+    if row is None:
+        row = rows[key] = {**fields, "case_ids": [], "sources": []}
+    case_id, source_image = provenance
+    if case_id is not None and case_id not in row["case_ids"]:
+        row["case_ids"].append(case_id)
+    if source_image and source_image not in row["sources"]:
+        row["sources"].append(source_image)
+    return row
+
+
+def flatten_reports(reports: list) -> dict:
+    """Merge a chunk of reports into one de-duplicated parameter list per entity type."""
+    locations = {}
+    symptoms = {}
+    reasons = {}
+    measures = {}
+
+    for data in reports:
+        loc_name = data["fault_location"]["name"]
+        machine = data["fault_location"].get("machine")
+        status = data.get("resolution_status") or "Unknown"
+        provenance = (data.get("case_id"), data.get("source_image"))
+
+        location = _entity_row(locations, loc_name, provenance, name=loc_name, machines=[])
+        if machine and machine not in location["machines"]:
+            location["machines"].append(machine)
+
+        report_symptoms = [s for s in data.get("fault_symptoms", []) if s]
+        for symptom in report_symptoms:
+            row = _entity_row(symptoms, symptom, provenance, description=symptom, locations=[])
+            if loc_name not in row["locations"]:
+                row["locations"].append(loc_name)
+
+        for reason in data.get("fault_reason", []):
+            if not reason.get("name"):
+                continue
+            row = _entity_row(reasons, reason["name"], provenance, name=reason["name"], symptoms=[])
+            row["symptoms"].extend(s for s in report_symptoms if s not in row["symptoms"])
+
+        for measure in data.get("fault_measures", []):
+            if not measure.get("description"):
+                continue
+            row = _entity_row(measures, measure["description"], provenance, description=measure["description"], links={})
+            # Later reports win, matching the SET in the per-item notebook import
+            for symptom in report_symptoms:
+                row["links"][symptom] = status
+
+    for row in measures.values():
+        row["links"] = [{"symptom": s, "status": st} for s, st in row["links"].items()]
+
+    return {
+        "locations": list(locations.values()),
+        "symptoms": list(symptoms.values()),
+        "reasons": list(reasons.values()),
+        "measures": list(measures.values()),
+    }
+
+
+def write_chunk(tx, rows: dict) -> None:
+    # Order matters: relationships MATCH the symptom and location nodes merged before them
+    tx.run(LOCATION_QUERY, rows=rows["locations"]).consume()
+    tx.run(SYMPTOM_QUERY, rows=rows["symptoms"]).consume()
+    tx.run(REASON_QUERY, rows=rows["reasons"]).consume()
+    tx.run(MEASURE_QUERY, rows=rows["measures"]).consume()
+
+
+def load_fault_reports(driver, reports, chunk_size: int = DEFAULT_CHUNK_SIZE, database=None) -> LoadStats:
+    """Write FaultReport records to Neo4j, one transaction per chunk of `chunk_size` records."""
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    stats = LoadStats()
+    started = time.perf_counter()
+    valid_reports = _valid_reports(reports, stats)
+
+    with driver.session(database=database) as session:
+        while chunk := list(islice(valid_reports, chunk_size)):
+            session.execute_write(write_chunk, flatten_reports(chunk))
+            stats.records += len(chunk)
+            stats.chunks += 1
+
+    if stats.records:
+        # Lets the app drop retrieval results cached before this import
+        bump_graph_version(driver, database)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def _valid_reports(reports, stats: LoadStats):
+    for entry in reports:
+        data = as_report_dict(entry)
+        if isinstance(data, dict) and (data.get("fault_location") or {}).get("name"):
+            yield data
+        else:
+            stats.skipped += 1
+
+
+def load_json_file(filepath: str) -> list:
+    with open(filepath, "r", encoding="utf-8") as f:
+        if filepath.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk import extracted fault reports into Neo4j.")
+    parser.add_argument("files", nargs="*", help="JSON or JSONL files with FaultReport records")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"records per transaction (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--skip-schema", action="store_true",
+                        help="do not ensure constraints and indexes before importing")
+    parser.add_argument("--migrate-provenance", action="store_true",
+                        help="convert old case_ids/source_image properties into Case/Source nodes first")
+    args = parser.parse_args(argv)
+    if not args.files and not args.migrate_provenance:
+        parser.error("give at least one input file, or --migrate-provenance to only migrate an existing graph")
+
+    reports = []
+    for path in args.files:
+        data = load_json_file(path)
+        print(f"Loaded {len(data)} cases from {path}")
+        reports.extend(data)
+
+    driver = create_driver()
+    try:
+        if not args.skip_schema:
+            # Without the key constraints every MERGE below is a label scan
+            ensure_schema(driver)
+        if args.migrate_provenance:
+            records, _, _ = driver.execute_query(MIGRATE_PROVENANCE_QUERY)
+            print(f"Migrated provenance properties on {records[0]['migrated']} nodes")
+            bump_graph_version(driver)
+        stats = load_fault_reports(driver, reports, chunk_size=args.chunk_size) if args.files else None
+    finally:
+        driver.close()
+    if stats is not None:
+        print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# Idempotent schema setup for the fault graph
+#
+# Creates the uniqueness constraints that back every MERGE/MATCH in the import
+# path, plus the vector and fulltext indexes the retriever searches. Safe to run
+# any number of times.
+#
+# Usage (from the src/ directory):
+#   python -m utils.graph_schema
+
+import argparse
+import re
+
+from neo4j import RoutingControl
+from neo4j.exceptions import Neo4jError
+from neo4j_graphrag.indexes import create_vector_index
+
+from utils.neo4j_connection import create_driver
+
+VECTOR_INDEX_NAME = "content_index"
+FULLTEXT_INDEX_NAME = "fulltext-index"
+EMBEDDING_LABEL = "TextChunk"
+EMBEDDING_PROPERTY = "embedding"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_DIMENSIONS = 1536
+
+# (label, key property) pairs that the loader MERGEs and MATCHes on, provenance included
+NODE_KEYS = [
+    ("FaultLocation", "name"),
+    ("FaultSymptom", "description"),
+    ("FaultReason", "name"),
+    ("FaultMeasure", "description"),
+    ("Case", "case_id"),
+    ("Source", "image"),
+    ("GraphMeta", "key"),
+]
+
+FULLTEXT_LABELS = ["FaultLocation", "FaultSymptom", "FaultReason", "FaultMeasure"]
+FULLTEXT_PROPERTIES = ["name", "description"]
+
+# Indexes the retriever cannot work without
+RETRIEVER_INDEXES = (VECTOR_INDEX_NAME, FULLTEXT_INDEX_NAME)
+
+# Raised when existing nodes violate a uniqueness constraint being created
+CONSTRAINT_CREATION_FAILED = "Neo.DatabaseError.Schema.ConstraintCreationFailed"
+
+
+def _schema_name(label: str, prop: str, suffix: str) -> str:
+    snake_label = re.sub(r"(?<!^)(?=[A-Z])", "_", label).lower()
+    return f"{snake_label}_{prop}_{suffix}"
+
+
+def _plain_range_index(driver, label: str, prop: str, database=None):
+    """Name of a range index on label.prop that no constraint owns, or None."""
+    records, _, _ = driver.execute_query(
+        "SHOW INDEXES YIELD name, type, labelsOrTypes, properties, owningConstraint "
+        "WHERE type = 'RANGE' AND labelsOrTypes = [$label] AND properties = [$prop] "
+        "AND owningConstraint IS NULL RETURN name",
+        label=label,
+        prop=prop,
+        database_=database,
+    )
+    return records[0]["name"] if records else None
+
+
+def ensure_key(driver, label: str, prop: str, database=None) -> str:
+    """Create a uniqueness constraint on label.prop, or a range index if existing duplicates block it."""
+    # A fallback index from an earlier run would make the constraint fail with
+    # IndexAlreadyExists; keep it until the duplicates are cleaned up and the index dropped
+    existing = _plain_range_index(driver, label, prop, database)
+    if existing is not None:
+        return f"range index on {label}.{prop} (existing index {existing})"
+    try:
+        driver.execute_query(
+            f"CREATE CONSTRAINT {_schema_name(label, prop, 'unique')} IF NOT EXISTS "
+            f"FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE",
+            database_=database,
+        )
+        return f"unique constraint on {label}.{prop}"
+    except Neo4jError as e:
+        # Graphs imported before the constraint existed can contain duplicate keys;
+        # anything else (syntax, permissions, edition) is a real error
+        if e.code != CONSTRAINT_CREATION_FAILED:
+            raise
+        driver.execute_query(
+            f"CREATE INDEX {_schema_name(label, prop, 'index')} IF NOT EXISTS "
+            f"FOR (n:{label}) ON (n.{prop})",
+            database_=database,
+        )
+        return f"range index on {label}.{prop} (constraint rejected: {e.code})"
+
+
+def ensure_search_indexes(driver, database=None) -> list:
+    create_vector_index(
+        driver,
+        VECTOR_INDEX_NAME,
+        label=EMBEDDING_LABEL,
+        embedding_property=EMBEDDING_PROPERTY,
+        dimensions=EMBEDDING_DIMENSIONS,
+        similarity_fn="cosine",
+        neo4j_database=database,
+    )
+    # create_fulltext_index only takes one label, so this one is written out
+    driver.execute_query(
+        f"CREATE FULLTEXT INDEX `{FULLTEXT_INDEX_NAME}` IF NOT EXISTS "
+        f"FOR (n:{'|'.join(FULLTEXT_LABELS)}) "
+        f"ON EACH [{', '.join('n.' + p for p in FULLTEXT_PROPERTIES)}]",
+        database_=database,
+    )
+    return [f"vector index {VECTOR_INDEX_NAME}", f"fulltext index {FULLTEXT_INDEX_NAME}"]
+
+
+def ensure_schema(driver, database=None, wait_seconds: int = 300) -> list:
+    """Create all constraints and indexes, wait for them to come online and return what was ensured."""
+    ensured = [ensure_key(driver, label, prop, database) for label, prop in NODE_KEYS]
+    ensured += ensure_search_indexes(driver, database)
+    if wait_seconds:
+        driver.execute_query("CALL db.awaitIndexes($timeout)", timeout=wait_seconds, database_=database)
+    return ensured
+
+
+def verify_indexes_online(driver, names=RETRIEVER_INDEXES, database=None) -> None:
+    """Raise RuntimeError unless every named index exists and is ONLINE."""
+    records, _, _ = driver.execute_query(
+        "SHOW INDEXES YIELD name, state WHERE name IN $names RETURN name, state",
+        names=list(names),
+        database_=database,
+    )
+    states = {record["name"]: record["state"] for record in records}
+    problems = [
+        f"{name} ({states.get(name, 'MISSING')})"
+        for name in names
+        if states.get(name) != "ONLINE"
+    ]
+    if problems:
+        raise RuntimeError(
+            "Neo4j indexes are not ready: " + ", ".join(problems)
+            + ". Run `python -m utils.graph_schema` from src/ to create them."
+        )
+
+
+def bump_graph_version(driver, database=None) -> int:
+    """Increment the graph version marker; call after every write that changes what retrieval returns."""
+    records, _, _ = driver.execute_query(
+        "MERGE (m:GraphMeta {key: 'graph'}) "
+        "SET m.version = coalesce(m.version, 0) + 1, m.updated_at = datetime() "
+        "RETURN m.version AS version",
+        database_=database,
+    )
+    return records[0]["version"]
+
+
+def read_graph_version(driver, database=None) -> int:
+    records, _, _ = driver.execute_query(
+        "OPTIONAL MATCH (m:GraphMeta {key: 'graph'}) RETURN coalesce(m.version, 0) AS version",
+        database_=database,
+        routing_=RoutingControl.READ,
+    )
+    return records[0]["version"]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Create the Neo4j constraints and indexes for the fault graph.")
+    parser.add_argument("--wait", type=int, default=300,
+                        help="seconds to wait for indexes to come online (default: 300, 0 to skip)")
+    args = parser.parse_args(argv)
+
+    driver = create_driver()
+    try:
+        for item in ensure_schema(driver, wait_seconds=args.wait):
+            print(f"Ensured {item}")
+        verify_indexes_online(driver)
+        print("Retriever indexes are ONLINE.")
+    finally:
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
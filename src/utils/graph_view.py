@@ -0,0 +1,78 @@
+# HTML for the D3 graph view shown under each answer
+#
+# src/d3_graph.html loads D3 from src/static/d3.v7.min.js, so the page works
+# without internet access (the shop-floor network is air-gapped). For the app,
+# the script is inlined once into the template, which is read, split around
+# the graph data placeholder and memoized on first use. Only each answer's
+# graph JSON is cached, per (pair, graph hash), and spliced between the two
+# template halves when a panel is shown, so the ~280 KB of D3 is held once
+# rather than once per cached answer.
+#
+# D3_SCRIPT_URL replaces the inlined script with a <script src> instead, for
+# example "app/static/d3.v7.min.js" when Streamlit static serving is enabled
+# and the browser should cache D3 between panels.
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parents[1]
+TEMPLATE_PATH = SRC_DIR / "d3_graph.html"
+D3_PATH = SRC_DIR / "static" / "d3.v7.min.js"
+D3_SCRIPT_TAG = '<script src="static/d3.v7.min.js"></script>'
+GRAPH_DATA_PLACEHOLDER = "{{GRAPH_DATA_JSON}}"
+DEFAULT_RENDERED_CACHE_SIZE = 256
+
+# (pair_id, graph hash) -> graph JSON
+_rendered = OrderedDict()
+_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def graph_template() -> str:
+    """The graph page with D3 inlined (or pointed at D3_SCRIPT_URL), read from disk once."""
+    template = TEMPLATE_PATH.read_text(encoding="utf-8")
+    script_url = os.getenv("D3_SCRIPT_URL", "").strip()
+    if script_url:
+        script = f'<script src="{script_url}"></script>'
+    else:
+        script = f"<script>\n{D3_PATH.read_text(encoding='utf-8')}\n</script>"
+    return template.replace(D3_SCRIPT_TAG, script)
+
+
+@lru_cache(maxsize=1)
+def _template_parts() -> tuple:
+    """The template before and after the graph data placeholder."""
+    head, _, tail = graph_template().partition(GRAPH_DATA_PLACEHOLDER)
+    return head, tail
+
+
+def graph_json(graph_data: dict) -> str:
+    # Node texts come from fault reports; keep "</script>" in them from closing the tag
+    return json.dumps(graph_data).replace("</", "<\\/")
+
+
+def graph_hash(graph_data: dict) -> str:
+    return hashlib.sha256(json.dumps(graph_data, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def render_graph_html(graph_data: dict, pair_id=None) -> str:
+    """HTML for one answer's graph; its JSON is cached per (pair_id, graph hash) across reruns and sessions."""
+    key = (pair_id, graph_hash(graph_data))
+    with _lock:
+        data_json = _rendered.get(key)
+        if data_json is not None:
+            _rendered.move_to_end(key)
+    if data_json is None:
+        data_json = graph_json(graph_data)
+        max_entries = int(os.getenv("GRAPH_HTML_CACHE_SIZE") or DEFAULT_RENDERED_CACHE_SIZE)
+        with _lock:
+            _rendered[key] = data_json
+            while len(_rendered) > max_entries:
+                _rendered.popitem(last=False)
+    head, tail = _template_parts()
+    return head + data_json + tail
@@ -0,0 +1,120 @@
+# Token-aware conversation history for follow-up questions
+#
+# The newest turns are sent verbatim as long as they fit HISTORY_TOKEN_BUDGET
+# (counted with tiktoken). Turns that no longer fit are folded into a rolling
+# summary, which is kept per conversation in the conversation store together
+# with the id of the last message it covers. It is updated incrementally:
+# only the newly evicted turns are summarized into the previous summary, with
+# a small model (HISTORY_SUMMARY_MODEL). Folding trims the verbatim part down
+# to half the budget, so the summary model runs once every few turns rather
+# than on every question.
+#
+# The summary is sent ahead of the verbatim turns as a system message. If the
+# summary call fails, the turns that fit the full budget are sent with the old
+# summary, and folding is retried on the next question.
+
+import logging
+import os
+
+from utils.context_packing import count_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_TOKEN_BUDGET = 1200
+DEFAULT_SUMMARY_TOKENS = 300
+DEFAULT_SUMMARY_MODEL = "gpt-4o-mini"
+# Per-message overhead of the chat format (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a troubleshooting conversation between a technician and an "
+    "assistant about an Ion Beam Machine. Update the summary with the new turns. Keep the machine "
+    "components, symptoms, likely causes, measures already tried and their results, and open questions; "
+    "drop greetings and repetition. Write in the language of the conversation, as short notes, "
+    "in at most {words} words. Reply with the updated summary only."
+)
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def fit_history(messages: list, budget: int = None) -> list:
+    """The newest messages that fit the token budget, oldest first, starting with a user turn."""
+    if budget is None:
+        budget = int(os.getenv("HISTORY_TOKEN_BUDGET") or DEFAULT_HISTORY_TOKEN_BUDGET)
+    kept = []
+    used = 0
+    for message in reversed(messages):
+        used += message_tokens(message)
+        if used > budget:
+            break
+        kept.append(message)
+    kept.reverse()
+    # An answer without its question reads as a non sequitur
+    while kept and kept[0]["role"] != "user":
+        kept.pop(0)
+    return kept
+
+
+def summary_message(summary: str) -> dict:
+    return {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}
+
+
+class HistoryManager:
+    """Prompt history for a stored conversation: a rolling summary plus the newest turns verbatim."""
+
+    def __init__(self, store, client=None, budget: int = None, summary_tokens: int = None, model: str = None):
+        self.store = store
+        self.client = client
+        self.budget = budget or int(os.getenv("HISTORY_TOKEN_BUDGET") or DEFAULT_HISTORY_TOKEN_BUDGET)
+        self.summary_tokens = summary_tokens or int(os.getenv("HISTORY_SUMMARY_TOKENS") or DEFAULT_SUMMARY_TOKENS)
+        self.model = model or os.getenv("HISTORY_SUMMARY_MODEL") or DEFAULT_SUMMARY_MODEL
+        self.summaries_made = 0
+
+    def history(self, conversation_id: int) -> list:
+        """Messages to send before the new question, as {"role", "content"} dicts."""
+        summary, covered_until = self.store.summary(conversation_id)
+        # Only turns after the summary are loaded, so this stays small however long the conversation is
+        recent = self.store.messages_after(conversation_id, covered_until)
+        verbatim = fit_history(recent, self.budget)
+        if len(verbatim) < len(recent):
+            folded = fit_history(recent, self.budget // 2)
+            new_summary = self._fold(conversation_id, summary, recent[:len(recent) - len(folded)])
+            if new_summary is not None:
+                summary, verbatim = new_summary, folded
+            # else: keep the old summary and the full-budget window, and retry on the next question
+
+        messages = [summary_message(summary)] if summary else []
+        messages += [{"role": message["role"], "content": message["content"]} for message in verbatim]
+        return messages
+
+    def _fold(self, conversation_id: int, summary: str, evicted: list):
+        """Fold the evicted turns into the summary and store it; None if the summary call failed."""
+        transcript = "\n\n".join(f"{message['role'].upper()}: {message['content']}" for message in evicted)
+        prompt = f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+        try:
+            response = self._client().chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT.format(words=int(self.summary_tokens * 0.7))},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=self.summary_tokens,
+                temperature=0,
+            )
+            new_summary = (response.choices[0].message.content or "").strip()
+        except Exception:
+            # Answering matters more than remembering
+            logger.warning("History summary failed for conversation %s", conversation_id, exc_info=True)
+            return None
+        self.store.save_summary(conversation_id, new_summary, evicted[-1]["id"])
+        self.summaries_made += 1
+        return new_summary
+
+    def _client(self):
+        if self.client is None:
+            from utils.chatbot_service import get_client
+
+            self.client = get_client()
+        return self.client
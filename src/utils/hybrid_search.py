@@ -0,0 +1,60 @@
+# Building blocks shared by the retrievers that run hybrid search step by step
+#
+# HybridCypherRetriever does vector search, fulltext search, score fusion and
+# traversal in one Cypher statement. The local-index and async retrievers split
+# those steps up, and use these helpers to stay result-compatible with it.
+
+import re
+
+from neo4j_graphrag.types import RetrieverResult, RetrieverResultItem
+
+VECTOR_QUERY = """
+CALL db.index.vector.queryNodes($index_name, $top_k, $query_vector)
+YIELD node, score
+RETURN elementId(node) AS node_id, score
+"""
+
+FULLTEXT_QUERY = """
+CALL db.index.fulltext.queryNodes($index_name, $query_text, {limit: $top_k})
+YIELD node, score
+RETURN elementId(node) AS node_id, score
+"""
+
+# Lucene operators in a free-text question would otherwise be parsed as query syntax
+_LUCENE_SPECIAL = re.compile(r'([+\-!(){}\[\]^"~*?:\\/&|])')
+
+
+def escape_lucene(text: str) -> str:
+    return _LUCENE_SPECIAL.sub(r"\\\1", text).strip()
+
+
+def fuse_hits(hit_lists, top_k: int) -> list:
+    """Same fusion as HybridCypherRetriever: normalize each list by its best score, keep the higher per node."""
+    fused = {}
+    for hits in hit_lists:
+        best = max((score for _, score in hits), default=0) or 1.0
+        for node_id, score in hits:
+            fused[node_id] = max(fused.get(node_id, 0.0), score / best)
+    return sorted(fused.items(), key=lambda hit: hit[1], reverse=True)[:top_k]
+
+
+def seeded_traversal_query(retrieval_query: str) -> str:
+    # Feeds (node, score) pairs from $hits into a retrieval query written for the hybrid search
+    return (
+        "UNWIND $hits AS hit\n"
+        "MATCH (node) WHERE elementId(node) = hit.node_id\n"
+        "WITH node, hit.score AS score\n"
+        + retrieval_query
+    )
+
+
+def hit_params(hits: list) -> list:
+    return [{"node_id": node_id, "score": score} for node_id, score in hits]
+
+
+def to_retriever_result(records, retriever_name: str, **metadata) -> RetrieverResult:
+    # Matches HybridCypherRetriever's default record formatter
+    return RetrieverResult(
+        items=[RetrieverResultItem(content=str(record), metadata=record.get("metadata")) for record in records],
+        metadata={"__retriever": retriever_name, **metadata},
+    )
@@ -0,0 +1,88 @@
+# Dutch/English language identification without external dependencies
+#
+# The app only needs to tell Dutch questions from English ones. Each word
+# contributes a score from two compact lookup tables built once at import:
+# function words that are almost exclusive to one language (words both
+# languages use, such as "is" and "we", count for neither), common maintenance
+# terms of each language (technicians often type keywords only, such as
+# "pomp kapot"), and character n-grams (with word boundaries) that are typical
+# of Dutch or English spelling. Positive scores mean Dutch. The result is deterministic, and
+# results are memoized per message since the same text is often checked more
+# than once (history, caching, retries).
+
+import re
+from functools import lru_cache
+
+NL_STOPWORDS = frozenset("""
+de het een en van dat die niet zijn er aan bij ook als maar om dan wat hoe waarom wanneer waar
+wordt worden werd kan kunnen moet moeten ik je jij mijn wij ons onze naar uit door nog al te op
+voor met deze dit welke zonder tijdens na wel geen heb heeft hebben wil graag tot nu hier daar
+""".split())
+
+EN_STOPWORDS = frozenset("""
+the a an and that this these those are were be been being not with without from what how why
+when where which who does do did has have can could should would will my your our you it its
+there here after before during into onto than then them they their
+""".split())
+
+# Common function words of both languages ("de pomp is kapot", "we had a leak"); they carry no
+# evidence either way and are scored as neutral rather than by their n-grams
+SHARED_WORDS = frozenset("is we in was had of over".split())
+
+# Maintenance vocabulary for keyword-only questions; only words that are not also used in the other language
+NL_TERMS = frozenset("""
+kapot defect lek lekkage storing pomp druk hoog laag traag instabiel spanning stroom koeling koelwater
+voeding verwarming bundel bron kamer klep lawaai trilling schakelt valt weg starten opstarten
+""".split())
+
+EN_TERMS = frozenset("""
+broken faulty leak leaking leakage pump pressure high low slow unstable voltage current cooling supply
+heater heating beam source chamber valve noise noisy vibration switches drops fails starts startup
+""".split())
+
+# Character n-gram weights on words padded with spaces; positive = Dutch
+_NGRAM_WEIGHTS = {
+    # Dutch spelling
+    "ij": 1.0, "aa": 1.0, "oe": 0.8, "ui": 0.8, "uu": 1.0, "sch": 1.0, "cht": 0.8, "ee": 0.4,
+    "eu": 0.6, "ou": -0.2, " ge": 0.6, "en ": 0.4, "je ": 0.8, "tje": 1.0, "lijk": 1.0, "heid": 1.0,
+    "kt ": 0.6, "zw": 0.8, " z": 0.4, "v": 0.2, "dt ": 1.0,
+    # English spelling
+    # No "-ing": it is as common in Dutch fault terms (storing, voeding, spanning) as in English
+    "th": -1.0, "wh": -1.0, "sh": -0.8, "tion": -1.0, "ly ": -0.8, "ck": -0.4,
+    "ea": -0.6, "ow": -0.4, "ay": -0.6, "w": -0.1, "y ": -0.6, "ies ": -0.8, "ed ": -0.6, "'s ": -0.6,
+}
+_NGRAM_LENGTHS = sorted({len(ngram) for ngram in _NGRAM_WEIGHTS})
+_STOPWORD_WEIGHT = 2.0
+_TERM_WEIGHT = 1.5
+_WORD = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+@lru_cache(maxsize=8192)
+def _word_score(word: str) -> float:
+    if word in SHARED_WORDS:
+        return 0.0
+    if word in NL_STOPWORDS:
+        return _STOPWORD_WEIGHT
+    if word in EN_STOPWORDS:
+        return -_STOPWORD_WEIGHT
+    if word in NL_TERMS:
+        return _TERM_WEIGHT
+    if word in EN_TERMS:
+        return -_TERM_WEIGHT
+    padded = f" {word} "
+    score = 0.0
+    for n in _NGRAM_LENGTHS:
+        for start in range(len(padded) - n + 1):
+            score += _NGRAM_WEIGHTS.get(padded[start:start + n], 0.0)
+    return score
+
+
+def language_scores(text: str) -> float:
+    """Summed evidence over all words; positive means Dutch, negative English."""
+    return sum(_word_score(word) for word in _WORD.findall(text.casefold()))
+
+
+@lru_cache(maxsize=4096)
+def identify_language(text: str) -> str:
+    """Return "nl" or "en"; text with no evidence either way counts as English."""
+    return "nl" if language_scores(text) > 0 else "en"
@@ -0,0 +1,212 @@
+# In-process vector index as an alternative to the Neo4j content_index
+#
+# The embeddings are exported once from Neo4j into a float32 .npy file (opened
+# memory-mapped) plus a JSON table of element ids. Queries are a single NumPy
+# matmul over the unit-normalized matrix; for larger graphs an optional IVF
+# partitioning (k-means centroids, search only the nprobe closest lists, or
+# more when those hold fewer than top_k vectors) cuts the scan further.
+# LocalHybridRetriever fuses these hits with the Neo4j fulltext index the same
+# way HybridCypherRetriever does and then runs the traversal query only for
+# the winning node ids, so the app sees the same result shape from either
+# backend.
+#
+# Export (from the src/ directory), re-run after the embedding job:
+#   python -m utils.local_vector_index
+#
+# Then set VECTOR_BACKEND=local to serve from it.
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from neo4j_graphrag.types import RetrieverResult
+
+from utils.graph_schema import (
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_LABEL,
+    EMBEDDING_MODEL,
+    EMBEDDING_PROPERTY,
+    FULLTEXT_INDEX_NAME,
+    read_graph_version,
+)
+from utils.hybrid_search import (
+    FULLTEXT_QUERY,
+    escape_lucene,
+    fuse_hits,
+    hit_params,
+    seeded_traversal_query,
+    to_retriever_result,
+)
+from utils.neo4j_connection import create_driver
+
+DEFAULT_INDEX_DIR = Path(__file__).resolve().parents[2] / ".cache" / "vector_index"
+DEFAULT_NPROBE = 4
+_EXPORT_BATCH = 1000
+
+EXPORT_QUERY = f"""
+MATCH (n:{EMBEDDING_LABEL})
+WHERE n.{EMBEDDING_PROPERTY} IS NOT NULL
+RETURN elementId(n) AS node_id, n.{EMBEDDING_PROPERTY} AS embedding
+"""
+
+
+def index_dir() -> Path:
+    return Path(os.getenv("LOCAL_VECTOR_INDEX_DIR") or DEFAULT_INDEX_DIR)
+
+
+def export_embeddings(driver, directory=None, database=None) -> int:
+    """Write every node embedding to vectors.npy / ids.json and return the number of vectors."""
+    directory = Path(directory or index_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    version = read_graph_version(driver, database)
+    records, _, _ = driver.execute_query(EXPORT_QUERY, database_=database)
+
+    # Write through a memmap so the export never holds two copies of the matrix
+    tmp_path = directory / "vectors.tmp.npy"
+    vectors = np.lib.format.open_memmap(
+        tmp_path, mode="w+", dtype=np.float32, shape=(len(records), EMBEDDING_DIMENSIONS)
+    )
+    ids = []
+    for start in range(0, len(records), _EXPORT_BATCH):
+        chunk = records[start:start + _EXPORT_BATCH]
+        matrix = np.asarray([record["embedding"] for record in chunk], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        vectors[start:start + len(chunk)] = matrix
+        ids.extend(str(record["node_id"]) for record in chunk)
+    vectors.flush()
+    del vectors
+
+    tmp_path.replace(directory / "vectors.npy")
+    (directory / "ids.json").write_text(json.dumps(ids), encoding="utf-8")
+    (directory / "meta.json").write_text(
+        json.dumps({"model": EMBEDDING_MODEL, "dimensions": EMBEDDING_DIMENSIONS, "graph_version": version}),
+        encoding="utf-8",
+    )
+    return len(ids)
+
+
+class LocalVectorIndex:
+    """Memory-mapped cosine top-k search, exhaustive or IVF-partitioned."""
+
+    def __init__(self, vectors: np.ndarray, ids: list, meta: dict = None, nlist: int = 0, nprobe: int = None):
+        self.vectors = vectors
+        self.ids = ids
+        self.meta = meta or {}
+        self.nprobe = nprobe or int(os.getenv("LOCAL_VECTOR_NPROBE") or DEFAULT_NPROBE)
+        self.centroids = None
+        self.lists = None
+        if nlist and nlist < len(ids):
+            self._build_ivf(nlist)
+
+    @classmethod
+    def load(cls, directory=None, nlist: int = None, nprobe: int = None) -> "LocalVectorIndex":
+        directory = Path(directory or index_dir())
+        if not (directory / "vectors.npy").exists():
+            raise RuntimeError(
+                f"No local vector index in {directory}. Export one with: python -m utils.local_vector_index"
+            )
+        vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+        ids = json.loads((directory / "ids.json").read_text(encoding="utf-8"))
+        meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+        if nlist is None:
+            nlist = int(os.getenv("LOCAL_VECTOR_NLIST") or 0)
+        return cls(vectors, ids, meta, nlist=nlist, nprobe=nprobe)
+
+    def _build_ivf(self, nlist: int, iterations: int = 10) -> None:
+        # Plain spherical k-means; the graph is small enough to do this at load time
+        rng = np.random.default_rng(0)
+        centroids = np.array(self.vectors[rng.choice(len(self.ids), nlist, replace=False)])
+        for _ in range(iterations):
+            assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = self.vectors[assignment == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[cluster] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == cluster) for cluster in range(nlist)]
+
+    def search(self, query_vector, top_k: int = 5) -> list:
+        """Return up to top_k (node_id, cosine similarity) pairs, best first."""
+        if not self.ids:
+            return []
+        query = np.array(query_vector, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        if self.centroids is None:
+            candidates = None
+            scores = self.vectors @ query
+        else:
+            # The nprobe closest lists, plus further ones while they hold fewer than top_k vectors
+            probed = []
+            found = 0
+            for cluster in np.argsort(-(self.centroids @ query)):
+                if len(probed) >= self.nprobe and found >= top_k:
+                    break
+                probed.append(self.lists[cluster])
+                found += len(self.lists[cluster])
+            candidates = np.concatenate(probed)
+            scores = self.vectors[candidates] @ query
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        rows = best if candidates is None else candidates[best]
+        return [(self.ids[row], float(scores[i])) for row, i in zip(rows, best)]
+
+
+class LocalHybridRetriever:
+    """HybridCypherRetriever-compatible search() backed by a LocalVectorIndex."""
+
+    def __init__(self, driver, index: LocalVectorIndex, embedder, retrieval_query: str,
+                 fulltext_index_name: str = FULLTEXT_INDEX_NAME, database=None):
+        self.driver = driver
+        self.index = index
+        self.embedder = embedder
+        self.retrieval_query = retrieval_query
+        self.fulltext_index_name = fulltext_index_name
+        self.database = database
+        self._traversal_query = seeded_traversal_query(retrieval_query)
+
+    def _fulltext_hits(self, query_text: str, top_k: int) -> list:
+        escaped = escape_lucene(query_text)
+        if not escaped:
+            return []
+        records, _, _ = self.driver.execute_query(
+            FULLTEXT_QUERY, index_name=self.fulltext_index_name, query_text=escaped, top_k=top_k,
+            database_=self.database,
+        )
+        return [(record["node_id"], record["score"]) for record in records]
+
+    def search(self, query_text: str, top_k: int = 5, query_vector=None) -> RetrieverResult:
+        if query_vector is None:
+            query_vector = self.embedder.embed_query(query_text)
+        # Neo4j reports cosine vector scores as (1 + cos) / 2; keep the same scale
+        vector_hits = [(node_id, (1 + score) / 2) for node_id, score in self.index.search(query_vector, top_k)]
+        fulltext_hits = self._fulltext_hits(query_text, top_k)
+        winners = fuse_hits([vector_hits, fulltext_hits], top_k)
+
+        records, _, _ = self.driver.execute_query(
+            self._traversal_query, hits=hit_params(winners), database_=self.database
+        )
+        return to_retriever_result(records, type(self).__name__)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Export node embeddings from Neo4j into a local vector index.")
+    parser.add_argument("--output", default=None, help="index directory (default: LOCAL_VECTOR_INDEX_DIR)")
+    args = parser.parse_args(argv)
+
+    driver = create_driver()
+    try:
+        count = export_embeddings(driver, args.output)
+    finally:
+        driver.close()
+    print(f"Exported {count} vectors to {Path(args.output or index_dir())}")
+
+
+if __name__ == "__main__":
+    main()
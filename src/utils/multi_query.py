@@ -0,0 +1,145 @@
+# Multi-query retrieval for mixed Dutch/English content
+#
+# The graph holds Dutch maintenance logs next to an English manual, so a
+# question in one language tends to miss nodes written in the other. With
+# MULTI_QUERY_RETRIEVAL=true the app searches several variants of the
+# question in parallel:
+#
+#   original   the question as typed (starts immediately)
+#   translated the question in the other language (starts once a short chat
+#              completion returns the translation; dropped if that takes longer
+#              than MULTI_QUERY_TRANSLATION_TIMEOUT seconds)
+#   keywords   the question without stopwords and punctuation, which mostly
+#              helps the fulltext index (MULTI_QUERY_KEYWORDS=true)
+#
+# Each variant produces a fused vector+fulltext ranking; the rankings are
+# merged with reciprocal rank fusion and the traversal runs once from the
+# merged winners. Per-variant latencies are returned in the result metadata.
+
+import asyncio
+import os
+import re
+import time
+
+from neo4j_graphrag.types import RetrieverResult
+
+from utils.hybrid_search import to_retriever_result
+
+DEFAULT_TRANSLATION_MODEL = "gpt-4o-mini"
+DEFAULT_TRANSLATION_TIMEOUT = 1.5
+RRF_K = 60
+
+TRANSLATION_PROMPT = (
+    "You translate short industrial maintenance questions about an Ion Beam Machine. "
+    "If the question is Dutch, translate it to English; otherwise translate it to Dutch. "
+    "Keep technical terms and part names. Reply with the translation only."
+)
+
+STOPWORDS = frozenset("""
+a an and are at be by can do does for from how i if in is it my of on or should that the this to was what
+when where which why with you your
+de het een en van in is op te dat die voor met niet zijn er aan bij ook als maar om dan wat hoe
+waarom wanneer waar wordt worden kan moet ik je mijn we ons naar uit door over of nog al
+""".split())
+
+
+def multi_query_enabled() -> bool:
+    return os.getenv("MULTI_QUERY_RETRIEVAL", "").strip().lower() in ("1", "true", "yes")
+
+
+def keyword_query(question: str) -> str:
+    words = re.findall(r"\w+", question.casefold())
+    return " ".join(word for word in words if word not in STOPWORDS)
+
+
+def reciprocal_rank_fusion(rankings, top_k: int, k: int = RRF_K) -> list:
+    """Merge (node_id, score) rankings by summing 1 / (k + rank) per node."""
+    fused = {}
+    for ranking in rankings:
+        for rank, (node_id, _) in enumerate(ranking, start=1):
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda hit: hit[1], reverse=True)[:top_k]
+
+
+class MultiQueryRetriever:
+    """Fans a question out into language/keyword variants over an AsyncHybridRetriever and RRF-merges them."""
+
+    def __init__(self, retriever, client, translation_model: str = None, keywords: bool = None,
+                 candidates_per_variant: int = None, translation_timeout: float = None):
+        self.retriever = retriever
+        self.client = client
+        self.translation_model = (
+            translation_model or os.getenv("MULTI_QUERY_TRANSLATION_MODEL") or DEFAULT_TRANSLATION_MODEL
+        )
+        self.translation_timeout = float(
+            translation_timeout if translation_timeout is not None
+            else os.getenv("MULTI_QUERY_TRANSLATION_TIMEOUT") or DEFAULT_TRANSLATION_TIMEOUT
+        )
+        self.keywords = (
+            keywords if keywords is not None
+            else os.getenv("MULTI_QUERY_KEYWORDS", "").strip().lower() in ("1", "true", "yes")
+        )
+        self.candidates_per_variant = candidates_per_variant
+        self.retrieval_query = retriever.retrieval_query
+
+    async def translate(self, question: str) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.translation_model,
+            messages=[
+                {"role": "system", "content": TRANSLATION_PROMPT},
+                {"role": "user", "content": question},
+            ],
+            temperature=0,
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    async def _variant(self, kind: str, query, started: float, top_k: int) -> dict:
+        result = {"kind": kind}
+        if not isinstance(query, str):
+            # The translation: a failed or slow call drops this variant instead of
+            # holding up the whole search
+            step_started = time.perf_counter()
+            try:
+                query = await asyncio.wait_for(query, self.translation_timeout)
+            except asyncio.TimeoutError:
+                result["error"] = "timeout"
+                query = ""
+            except Exception as error:
+                result["error"] = str(error)
+                query = ""
+            result["translation_ms"] = round((time.perf_counter() - step_started) * 1000, 1)
+        step_started = time.perf_counter()
+        hits = await self.retriever.ranked_hits(query, top_k, result) if query else []
+        result.update(
+            query=query,
+            hits=hits,
+            search_ms=round((time.perf_counter() - step_started) * 1000, 1),
+            # Wall-clock time from the start of the fan-out until this variant finished
+            done_ms=round((time.perf_counter() - started) * 1000, 1),
+        )
+        return result
+
+    async def asearch(self, query_text: str, top_k: int = 5) -> RetrieverResult:
+        started = time.perf_counter()
+        candidates = self.candidates_per_variant or top_k * 2
+        variants = [
+            self._variant("original", query_text, started, candidates),
+            self._variant("translated", self.translate(query_text), started, candidates),
+        ]
+        keywords = keyword_query(query_text)
+        if self.keywords and keywords and keywords != query_text.casefold().strip():
+            variants.append(self._variant("keywords", keywords, started, candidates))
+        results = await asyncio.gather(*variants)
+
+        winners = reciprocal_rank_fusion([result["hits"] for result in results], top_k)
+        timings = {"fanout_ms": round((time.perf_counter() - started) * 1000, 1)}
+        traversal_started = time.perf_counter()
+        records = await self.retriever.traverse(winners)
+        timings["traversal_ms"] = round((time.perf_counter() - traversal_started) * 1000, 1)
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return to_retriever_result(
+            records,
+            type(self).__name__,
+            timings=timings,
+            variants=[{key: value for key, value in result.items() if key != "hits"} for result in results],
+        )
@@ -0,0 +1,49 @@
+# Shared Neo4j connection settings for the app, the retriever and the import scripts
+
+import os
+import codecs
+from pathlib import Path
+
+from dotenv import load_dotenv
+from neo4j import AsyncGraphDatabase, GraphDatabase
+
+env_path = Path(__file__).resolve().parents[2] / ".env"
+load_dotenv(dotenv_path=env_path, encoding="utf-8-sig")
+
+
+def require_env(*names: str) -> dict:
+    """Return the requested environment variables, failing on any that are empty."""
+    values = {name: os.getenv(name) or "" for name in names}
+    missing_env = [name for name, value in values.items() if not value.strip()]
+    if missing_env:
+        raise RuntimeError(
+            "Missing required environment variables: " + ", ".join(missing_env)
+        )
+    return values
+
+
+def sanitize_uri(uri: str) -> str:
+    # Sanitize and decode URI values that were copied with escaped characters.
+    if "\\x3a" in uri:
+        # Decode any \xNN escapes to actual chars
+        uri = codecs.decode(uri, "unicode_escape")
+    elif "\\x" in uri:
+        # Generic handler for any \xNN pattern:
+        uri = uri.encode("utf-8").decode("unicode-escape")
+    return uri
+
+
+def _connection_settings():
+    # Read environment variables without logging sensitive connection details.
+    env = require_env("NEO4J_URI", "NEO4J_USER", "NEO4J_PASS")
+    return sanitize_uri(env["NEO4J_URI"].strip()), (env["NEO4J_USER"], env["NEO4J_PASS"])
+
+
+def create_driver(**driver_config):
+    uri, auth = _connection_settings()
+    return GraphDatabase.driver(uri, auth=auth, **driver_config)
+
+
+def create_async_driver(**driver_config):
+    uri, auth = _connection_settings()
+    return AsyncGraphDatabase.driver(uri, auth=auth, **driver_config)
@@ -0,0 +1,168 @@
+# Process-wide resources for the app: Neo4j drivers, query embedder, retriever
+#
+# Everything is created on first use and then shared by all Streamlit sessions
+# (and reruns) in the process. The drivers get their pool settings from the
+# environment, are checked for connectivity when created, and the retriever
+# refuses to start while its indexes are missing or still populating.
+#
+# start_warm_up() runs a few representative questions through the retriever
+# in a background thread, so the first technician after a deploy does not pay
+# for connection setup, a cold Neo4j page cache and cold index pages.
+#
+# The driver, OpenAI and retriever modules are imported inside the factories,
+# so importing this module is cheap and the warm-up thread pays for them
+# instead of the first page render.
+#
+# Health check and warm-up from the command line (from the src/ directory):
+#   python -m utils.resources
+
+import os
+import threading
+import time
+
+DEFAULT_MAX_CONNECTION_POOL_SIZE = 50
+DEFAULT_CONNECTION_ACQUISITION_TIMEOUT = 30.0
+DEFAULT_MAX_CONNECTION_LIFETIME = 3600.0
+DEFAULT_LIVENESS_CHECK_TIMEOUT = 60.0
+DEFAULT_WARMUP_QUESTIONS = "filament start traag|vacuum pump does not reach pressure"
+
+_resources = {}
+_lock = threading.RLock()
+_warm_up_thread = None
+
+
+def pool_config() -> dict:
+    """Neo4j driver pool settings from the environment."""
+    return {
+        "max_connection_pool_size": int(
+            os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE") or DEFAULT_MAX_CONNECTION_POOL_SIZE
+        ),
+        "connection_acquisition_timeout": float(
+            os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT") or DEFAULT_CONNECTION_ACQUISITION_TIMEOUT
+        ),
+        "max_connection_lifetime": float(
+            os.getenv("NEO4J_MAX_CONNECTION_LIFETIME") or DEFAULT_MAX_CONNECTION_LIFETIME
+        ),
+        # Connections idle for longer than this are pinged before reuse
+        "liveness_check_timeout": float(
+            os.getenv("NEO4J_LIVENESS_CHECK_TIMEOUT") or DEFAULT_LIVENESS_CHECK_TIMEOUT
+        ),
+    }
+
+
+def _once(name: str, factory):
+    resource = _resources.get(name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(name)
+            if resource is None:
+                resource = _resources[name] = factory()
+    return resource
+
+
+def _new_driver():
+    from utils.neo4j_connection import create_driver
+
+    driver = create_driver(**pool_config())
+    driver.verify_connectivity()
+    return driver
+
+
+def get_driver():
+    return _once("driver", _new_driver)
+
+
+def get_async_driver():
+    from utils.neo4j_connection import create_async_driver
+
+    # Bound to the background event loop used by run_async()
+    return _once("async_driver", lambda: create_async_driver(**pool_config()))
+
+
+def get_embedder():
+    from utils.retriever import build_embedder
+
+    return _once("embedder", build_embedder)
+
+
+def _new_retriever():
+    from utils.graph_schema import verify_indexes_online
+    from utils.neo4j_connection import require_env
+    from utils.retriever import build_retriever
+
+    # Fail early with one message that lists every missing variable.
+    require_env("NEO4J_URI", "NEO4J_USER", "NEO4J_PASS", "OPENAI_API_KEY")
+    driver = get_driver()
+    # Refuse to serve if the indexes are missing or still populating
+    verify_indexes_online(driver)
+    return build_retriever(driver, get_async_driver(), get_embedder())
+
+
+def get_retriever():
+    return _once("retriever", _new_retriever)
+
+
+def warmup_questions() -> list:
+    questions = os.getenv("WARMUP_QUESTIONS", DEFAULT_WARMUP_QUESTIONS)
+    return [question.strip() for question in questions.split("|") if question.strip()]
+
+
+def warm_up(questions: list = None) -> dict:
+    """Run representative questions through the uncached async search path; return seconds per question."""
+    from utils.async_retriever import run_async
+
+    retriever = get_retriever()
+    search = retriever.async_retriever or retriever.retriever
+    timings = {}
+    for question in questions if questions is not None else warmup_questions():
+        started = time.perf_counter()
+        if hasattr(search, "asearch"):
+            run_async(search.asearch(query_text=question, top_k=2))
+        else:
+            search.search(query_text=question, top_k=2)
+        timings[question] = round(time.perf_counter() - started, 3)
+    return timings
+
+
+def start_warm_up() -> None:
+    """Warm up once per process in a background thread; later calls do nothing."""
+    global _warm_up_thread
+    with _lock:
+        if _warm_up_thread is not None:
+            return
+
+        def run():
+            try:
+                warm_up()
+            except Exception as error:
+                # A failed warm-up only costs latency; the first real question surfaces real errors
+                print(f"Warm-up failed: {error}")
+
+        _warm_up_thread = threading.Thread(target=run, name="retriever-warm-up", daemon=True)
+        _warm_up_thread.start()
+
+
+def close() -> None:
+    with _lock:
+        driver = _resources.pop("driver", None)
+        async_driver = _resources.pop("async_driver", None)
+        _resources.clear()
+    if driver is not None:
+        driver.close()
+    if async_driver is not None:
+        from utils.async_retriever import run_async
+
+        run_async(async_driver.close())
+
+
+def main() -> None:
+    started = time.perf_counter()
+    get_retriever()
+    print(f"Connected and verified indexes in {time.perf_counter() - started:.2f}s")
+    for question, seconds in warm_up().items():
+        print(f"{seconds:.3f}s  {question}")
+    close()
+
+
+if __name__ == "__main__":
+    main()
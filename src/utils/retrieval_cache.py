@@ -0,0 +1,116 @@
+# Retrieval result cache with graph-version invalidation
+#
+# Results are keyed on (normalized question, top_k, hash of the retrieval
+# query) and expire after a TTL. Every ingestion path bumps a version counter on
+# a (:GraphMeta) node; the cache re-reads that counter on every lookup (one
+# indexed node read) and drops everything cached under an older version, so a
+# repeat question skips the retrieval and results from before a graph update
+# are never served. GRAPH_VERSION_CHECK_SECONDS > 0 opts into reading it at
+# most that often instead, accepting stale results for up to that long.
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+from cachetools import TTLCache
+
+from utils.embedding_cache import normalize_query
+from utils.graph_schema import read_graph_version
+
+DEFAULT_TTL_SECONDS = 600
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_VERSION_CHECK_SECONDS = 0
+
+
+class CachedRetriever:
+    """Drop-in wrapper around a retriever's search() that caches results per graph version."""
+
+    def __init__(self, retriever, driver, ttl: float = None, maxsize: int = None,
+                 version_check_seconds: float = None, database=None, async_retriever=None):
+        self.retriever = retriever
+        self.async_retriever = async_retriever
+        self.driver = driver
+        self.database = database
+        self.version_check_seconds = float(
+            version_check_seconds if version_check_seconds is not None
+            else os.getenv("GRAPH_VERSION_CHECK_SECONDS") or DEFAULT_VERSION_CHECK_SECONDS
+        )
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._results = TTLCache(
+            maxsize=maxsize or int(os.getenv("RETRIEVAL_CACHE_SIZE") or DEFAULT_MAX_ENTRIES),
+            ttl=ttl or float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS") or DEFAULT_TTL_SECONDS),
+        )
+        self._query_hash = hashlib.sha256(retriever.retrieval_query.encode("utf-8")).hexdigest()[:16]
+        self._version = None
+        self._version_checked = 0.0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Everything except search() behaves like the wrapped retriever
+        return getattr(self.retriever, name)
+
+    def graph_version(self):
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked >= self.version_check_seconds:
+            version = read_graph_version(self.driver, self.database)
+            with self._lock:
+                if self._version is not None and version != self._version:
+                    self._results.clear()
+                    self.invalidations += 1
+                self._version = version
+                self._version_checked = now
+        return self._version
+
+    def search(self, query_text: str, top_k: int = 5, **kwargs):
+        if kwargs:
+            # Vectors, filters and ranker options are not part of the key
+            return self.retriever.search(query_text=query_text, top_k=top_k, **kwargs)
+
+        version = self.graph_version()
+        key = (normalize_query(query_text), top_k, self._query_hash)
+        result = self._cached(key, version)
+        if result is None:
+            result = self.retriever.search(query_text=query_text, top_k=top_k)
+            self._store(key, version, result)
+        return result
+
+    async def asearch(self, query_text: str, top_k: int = 5):
+        """search() for the async retriever; both share one cache."""
+        # The version check is a short blocking query
+        version = await asyncio.to_thread(self.graph_version)
+        key = (normalize_query(query_text), top_k, self._query_hash)
+        result = self._cached(key, version)
+        if result is None:
+            if self.async_retriever is not None:
+                result = await self.async_retriever.asearch(query_text=query_text, top_k=top_k)
+            else:
+                result = await asyncio.to_thread(self.retriever.search, query_text=query_text, top_k=top_k)
+            self._store(key, version, result)
+        return result
+
+    def _cached(self, key, version):
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] == version:
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        return None
+
+    def _store(self, key, version, result) -> None:
+        with self._lock:
+            self._results[key] = (version, result)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "graph_version": self._version,
+        }
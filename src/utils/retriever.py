@@ -1,94 +1,89 @@
 # Setting up HybridCypherRetriever
+#
+# This module only describes how the retriever is assembled. The driver,
+# embedder and retriever themselves are created lazily, once per process, by
+# utils.resources; `from utils.retriever import retriever` still works and
+# goes through it.
 
 import os
-from neo4j import GraphDatabase
-from dotenv import load_dotenv
-from pathlib import Path
-import codecs
 
 from neo4j_graphrag.retrievers import HybridCypherRetriever
 from neo4j_graphrag.embeddings import OpenAIEmbeddings
+from openai import AsyncOpenAI
 
-env_path = Path(__file__).resolve().parents[2] / ".env"
-load_dotenv(dotenv_path=env_path, encoding="utf-8-sig")
+from utils.async_retriever import AsyncHybridRetriever
+from utils.embedding_cache import CachedEmbedder, EmbeddingCache, LRUQueryEmbedder
+from utils.graph_schema import EMBEDDING_MODEL, FULLTEXT_INDEX_NAME, VECTOR_INDEX_NAME, read_graph_version
+from utils.local_vector_index import LocalHybridRetriever, LocalVectorIndex
+from utils.multi_query import MultiQueryRetriever, multi_query_enabled
+from utils.retrieval_cache import CachedRetriever
+from utils.traversal_queries import traversal_query
 
-# Read environment variables without logging sensitive connection details.
-uri = os.getenv("NEO4J_URI", "").strip()
-user = os.getenv("NEO4J_USER")
-pwd = os.getenv("NEO4J_PASS")
-openai_api_key = os.getenv("OPENAI_API_KEY")
+INDEX_NAME = VECTOR_INDEX_NAME
 
-missing_env = [
-    name for name, value in {
-        "NEO4J_URI": uri,
-        "NEO4J_USER": user,
-        "NEO4J_PASS": pwd,
-        "OPENAI_API_KEY": openai_api_key,
-    }.items()
-    if not value
-]
+# One row per reason x measure combination, or one aggregated record per
+# symptom with RETRIEVAL_TRAVERSAL=aggregated (see utils/traversal_queries.py)
+cypher_traversal_query = traversal_query()
 
-if missing_env:
-    raise RuntimeError(
-        "Missing required environment variables: " + ", ".join(missing_env)
+
+def build_embedder():
+    # Recent questions are answered from an in-process LRU shared by all Streamlit
+    # sessions, older ones from the on-disk cache shared with the embedding job
+    return LRUQueryEmbedder(
+        CachedEmbedder(OpenAIEmbeddings(model=EMBEDDING_MODEL), EMBEDDING_MODEL, EmbeddingCache())
     )
 
-# Sanitize and decode URI values that were copied with escaped characters.
-if "\\x3a" in uri:
-    # Decode any \xNN escapes to actual chars
-    uri = codecs.decode(uri, "unicode_escape")
-elif "\\x" in uri:
-    # Generic handler for any \xNN pattern:
-    uri = uri.encode("utf-8").decode("unicode-escape")
 
-# Create Neo4j driver
-driver = GraphDatabase.driver(uri, auth=(user, pwd))
+def build_retriever(driver, async_driver, embedder) -> CachedRetriever:
+    # VECTOR_BACKEND=local answers the vector half in-process from an exported
+    # index (python -m utils.local_vector_index) instead of the Neo4j content_index
+    local_index = None
+    if os.getenv("VECTOR_BACKEND", "neo4j").strip().lower() == "local":
+        local_index = LocalVectorIndex.load()
+        if local_index.meta.get("graph_version") != read_graph_version(driver):
+            print("Warning: the local vector index is older than the graph; re-run python -m utils.local_vector_index")
+        hybrid_retriever = LocalHybridRetriever(
+            driver,
+            local_index,
+            embedder,
+            retrieval_query=cypher_traversal_query,
+            fulltext_index_name=FULLTEXT_INDEX_NAME,
+        )
+    else:
+        hybrid_retriever = HybridCypherRetriever(
+            driver,
+            vector_index_name=INDEX_NAME,
+            fulltext_index_name=FULLTEXT_INDEX_NAME,
+            retrieval_query=cypher_traversal_query,
+            embedder=embedder
+        )
+
+    # Same search with the fulltext query started while the question is being
+    # embedded; used by the app through retriever.asearch()
+    async_retriever = AsyncHybridRetriever(
+        async_driver,
+        AsyncOpenAI(),
+        embedder,
+        retrieval_query=cypher_traversal_query,
+        vector_index_name=INDEX_NAME,
+        fulltext_index_name=FULLTEXT_INDEX_NAME,
+        local_index=local_index,
+    )
+
+    # MULTI_QUERY_RETRIEVAL=true also searches a translation (and optionally a
+    # keyword form) of each question in parallel and merges them with RRF
+    if multi_query_enabled():
+        async_retriever = MultiQueryRetriever(async_retriever, async_retriever.client)
 
-INDEX_NAME = "content_index"
+    # Repeat questions skip Neo4j until the graph version changes or the entry expires
+    return CachedRetriever(hybrid_retriever, driver, async_retriever=async_retriever)
 
-embedder = OpenAIEmbeddings(model="text-embedding-ada-002")
 
-cypher_traversal_query = """
-WITH node, score
-OPTIONAL MATCH (node)<-[:CAUSED_BY]-(sym_from_reason:FaultSymptom)
-OPTIONAL MATCH (node)<-[:MITIGATED_BY]-(sym_from_measure:FaultSymptom)
-OPTIONAL MATCH (node)-[:HAS_FAULT]->(sym_from_loc:FaultSymptom)
-WITH node, score,
-    CASE 
-       WHEN sym_from_reason IS NOT NULL THEN sym_from_reason
-       WHEN sym_from_measure IS NOT NULL THEN sym_from_measure
-       WHEN sym_from_loc IS NOT NULL THEN sym_from_loc
-       WHEN node:FaultSymptom THEN node
-       ELSE NULL 
-    END AS symptom,
-    node:FaultLocation AS isLocation
-OPTIONAL MATCH (location:FaultLocation)-[:HAS_FAULT]->(symptom)
-OPTIONAL MATCH (symptom)-[:CAUSED_BY]->(reason:FaultReason)
-OPTIONAL MATCH (symptom)-[:MITIGATED_BY]->(measure:FaultMeasure)
-WITH coalesce(location, CASE WHEN isLocation THEN node END) AS location,
-     symptom, reason, measure, node, score
-RETURN 
-  coalesce(location.name, '') + ": " + coalesce(symptom.description, '') 
-    + CASE WHEN reason IS NOT NULL THEN " Cause: " + reason.name ELSE "" END 
-    + CASE WHEN measure IS NOT NULL THEN " Measure: " + measure.description ELSE "" END 
-  AS text,
-  score,
-  {
-    location: location.name, 
-    symptom: symptom.description, 
-    reason: reason.name, 
-    measure: measure.description,
-    location_id: elementId(location),
-    symptom_id: elementId(symptom),
-    reason_id: elementId(reason),
-    measure_id: elementId(measure)
-  } AS metadata
-"""
+def __getattr__(name):
+    # Backwards-compatible module attributes, created on first use
+    from utils import resources
 
-retriever = HybridCypherRetriever(
-    driver,
-    vector_index_name="content_index",
-    fulltext_index_name="fulltext-index",
-    retrieval_query=cypher_traversal_query,
-    embedder=embedder
-)
+    getters = {"driver": resources.get_driver, "embedder": resources.get_embedder, "retriever": resources.get_retriever}
+    if name in getters:
+        return getters[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
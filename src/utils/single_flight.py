@@ -0,0 +1,196 @@
+# Coalescing of identical in-flight work
+#
+# At shift start several technicians often ask the same question about the
+# same alarm within seconds. SingleFlight lets concurrent callers with the
+# same key share one coroutine (one retrieval) on an event loop. StreamFanOut
+# does the same for token streams: the first caller starts the upstream
+# stream, which is drained into a buffer by a background thread (sync
+# streams, Streamlit) or task (async streams, the API); every caller with the
+# same key, including ones that join halfway, replays the buffer and then
+# follows the live tokens. The upstream stream is closed once nobody is
+# listening any more; from then on the stream can no longer be joined, and a
+# new caller with the same key starts a fresh one.
+#
+# Only work that is in flight is shared; finished results are left to the
+# retrieval and answer caches. Both classes count how many calls were made
+# and how many were saved by sharing.
+
+import asyncio
+import threading
+
+
+class SingleFlight:
+    """Share one running coroutine between concurrent callers with the same key (one event loop)."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def run(self, key, factory):
+        future = self._inflight.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        # One caller giving up (e.g. a disconnected client) must not cancel the others
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._inflight)}
+
+
+class _Broadcast:
+    """Chunks of one upstream stream, with the number of subscribers still reading."""
+
+    def __init__(self, changed):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 1
+        # Set once the last subscriber left; the upstream is being closed and must not be joined
+        self.closing = False
+        # threading.Condition for sync streams, asyncio.Event for async ones
+        self.changed = changed
+
+
+class StreamFanOut:
+    """Share one upstream token stream between concurrent callers with the same key."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync = {}
+        self._async = {}
+        # Producer tasks of async streams, referenced until they finish so they are not garbage-collected
+        self._tasks = set()
+        self.streams = 0
+        self.shared = 0
+
+    def _join(self, registry: dict, key, changed):
+        """(broadcast, started here) for key, registering a new broadcast if none is in flight."""
+        with self._lock:
+            broadcast = registry.get(key)
+            if broadcast is not None and not broadcast.done and not broadcast.closing:
+                broadcast.subscribers += 1
+                self.shared += 1
+                return broadcast, False
+            broadcast = registry[key] = _Broadcast(changed())
+            self.streams += 1
+            return broadcast, True
+
+    def _leave(self, registry: dict, key, broadcast) -> None:
+        with self._lock:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                # Nobody is listening: unregister now, so a caller arriving while the
+                # upstream is being closed starts a fresh stream instead of a cut-off one
+                broadcast.closing = True
+                if registry.get(key) is broadcast:
+                    del registry[key]
+
+    def _finish(self, registry: dict, key, broadcast) -> None:
+        with self._lock:
+            broadcast.done = True
+            if registry.get(key) is broadcast:
+                del registry[key]
+
+    # -- synchronous streams (Streamlit) ------------------------------------
+
+    def stream(self, key, start):
+        """Iterate the tokens of start() (a generator factory), shared with concurrent callers."""
+        broadcast, leader = self._join(self._sync, key, threading.Condition)
+        if leader:
+            threading.Thread(
+                target=self._produce, args=(key, broadcast, start), name="answer-fan-out", daemon=True
+            ).start()
+        return self._subscribe(key, broadcast)
+
+    def _produce(self, key, broadcast, start) -> None:
+        upstream = None
+        try:
+            upstream = start()
+            for chunk in upstream:
+                with broadcast.changed:
+                    broadcast.chunks.append(chunk)
+                    broadcast.changed.notify_all()
+                if broadcast.closing:
+                    break
+        except Exception as error:
+            broadcast.error = error
+        finally:
+            if upstream is not None and hasattr(upstream, "close"):
+                upstream.close()
+            with broadcast.changed:
+                self._finish(self._sync, key, broadcast)
+                broadcast.changed.notify_all()
+
+    def _subscribe(self, key, broadcast):
+        read = 0
+        try:
+            while True:
+                with broadcast.changed:
+                    while read >= len(broadcast.chunks) and not broadcast.done:
+                        broadcast.changed.wait()
+                    new = broadcast.chunks[read:]
+                    read += len(new)
+                    finished = broadcast.done
+                yield from new
+                if finished:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+        finally:
+            self._leave(self._sync, key, broadcast)
+
+    # -- asynchronous streams (API) -----------------------------------------
+
+    async def astream(self, key, start):
+        """Async iterate the tokens of start() (an async generator factory), shared on this event loop."""
+        broadcast, leader = self._join(self._async, key, asyncio.Event)
+        if leader:
+            task = asyncio.ensure_future(self._aproduce(key, broadcast, start))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        read = 0
+        try:
+            while True:
+                while read >= len(broadcast.chunks) and not broadcast.done:
+                    broadcast.changed.clear()
+                    await broadcast.changed.wait()
+                new = broadcast.chunks[read:]
+                read += len(new)
+                for chunk in new:
+                    yield chunk
+                if broadcast.done and read >= len(broadcast.chunks):
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+        finally:
+            self._leave(self._async, key, broadcast)
+
+    async def _aproduce(self, key, broadcast, start) -> None:
+        upstream = None
+        try:
+            upstream = start()
+            async for chunk in upstream:
+                broadcast.chunks.append(chunk)
+                broadcast.changed.set()
+                if broadcast.closing:
+                    break
+        except Exception as error:
+            broadcast.error = error
+        finally:
+            if upstream is not None:
+                await upstream.aclose()
+            self._finish(self._async, key, broadcast)
+            broadcast.changed.set()
+
+    def stats(self) -> dict:
+        return {"streams": self.streams, "shared": self.shared}
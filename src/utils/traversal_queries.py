@@ -0,0 +1,127 @@
+# Cypher traversals that expand retrieved nodes into fault context
+#
+# Both start from the (node, score) pairs produced by the hybrid search.
+#
+# "rows" is the original traversal: chained OPTIONAL MATCHes that return one
+# row per location x symptom x reason x measure combination, so a symptom with
+# R reasons and M measures comes back as R*M rows that the app deduplicates.
+#
+# "aggregated" returns one record per (retrieved node, symptom), with the
+# locations, reasons and measures collected into lists by pattern
+# comprehensions, so Neo4j never builds the cross product.
+#
+# RETRIEVAL_TRAVERSAL selects the mode used by the retriever (default: rows).
+
+import os
+from itertools import zip_longest
+
+ROW_TRAVERSAL_QUERY = """
+WITH node, score
+OPTIONAL MATCH (node)<-[:CAUSED_BY]-(sym_from_reason:FaultSymptom)
+OPTIONAL MATCH (node)<-[:MITIGATED_BY]-(sym_from_measure:FaultSymptom)
+OPTIONAL MATCH (node)-[:HAS_FAULT]->(sym_from_loc:FaultSymptom)
+WITH node, score,
+    CASE
+       WHEN sym_from_reason IS NOT NULL THEN sym_from_reason
+       WHEN sym_from_measure IS NOT NULL THEN sym_from_measure
+       WHEN sym_from_loc IS NOT NULL THEN sym_from_loc
+       WHEN node:FaultSymptom THEN node
+       ELSE NULL
+    END AS symptom,
+    node:FaultLocation AS isLocation
+OPTIONAL MATCH (location:FaultLocation)-[:HAS_FAULT]->(symptom)
+OPTIONAL MATCH (symptom)-[:CAUSED_BY]->(reason:FaultReason)
+OPTIONAL MATCH (symptom)-[:MITIGATED_BY]->(measure:FaultMeasure)
+WITH coalesce(location, CASE WHEN isLocation THEN node END) AS location,
+     symptom, reason, measure, node, score
+RETURN
+  coalesce(location.name, '') + ": " + coalesce(symptom.description, '')
+    + CASE WHEN reason IS NOT NULL THEN " Cause: " + reason.name ELSE "" END
+    + CASE WHEN measure IS NOT NULL THEN " Measure: " + measure.description ELSE "" END
+  AS text,
+  score,
+  {
+    location: location.name,
+    symptom: symptom.description,
+    reason: reason.name,
+    measure: measure.description,
+    location_id: elementId(location),
+    symptom_id: elementId(symptom),
+    reason_id: elementId(reason),
+    measure_id: elementId(measure),
+    score: score
+  } AS metadata
+"""
+
+AGGREGATED_TRAVERSAL_QUERY = """
+WITH node, score,
+    CASE
+       WHEN node:FaultSymptom THEN [node]
+       ELSE [(node)<-[:CAUSED_BY|MITIGATED_BY]-(s:FaultSymptom) | s]
+          + [(node)-[:HAS_FAULT]->(s:FaultSymptom) | s]
+    END AS symptoms
+UNWIND CASE WHEN symptoms = [] THEN [null] ELSE symptoms END AS symptom
+WITH DISTINCT node, score, symptom
+WITH node, score, symptom,
+    CASE WHEN symptom IS NULL THEN [] ELSE [(location:FaultLocation)-[:HAS_FAULT]->(symptom) | location] END
+      AS locations,
+    CASE WHEN symptom IS NULL THEN [] ELSE [(symptom)-[:CAUSED_BY]->(reason:FaultReason) | reason] END
+      AS reasons,
+    CASE WHEN symptom IS NULL THEN [] ELSE [(symptom)-[:MITIGATED_BY]->(measure:FaultMeasure) | measure] END
+      AS measures
+WITH node, score, symptom, reasons, measures,
+    CASE WHEN locations = [] AND node:FaultLocation THEN [node] ELSE locations END AS locations
+RETURN
+  reduce(s = '', l IN locations | s + CASE WHEN s = '' THEN '' ELSE ', ' END + l.name)
+    + ": " + coalesce(symptom.description, '')
+    + CASE WHEN reasons <> [] THEN " Causes: "
+        + reduce(s = '', r IN reasons | s + CASE WHEN s = '' THEN '' ELSE '; ' END + r.name) ELSE "" END
+    + CASE WHEN measures <> [] THEN " Measures: "
+        + reduce(s = '', m IN measures | s + CASE WHEN s = '' THEN '' ELSE '; ' END + m.description) ELSE "" END
+  AS text,
+  score,
+  {
+    locations: [l IN locations | l.name],
+    symptom: symptom.description,
+    reasons: [r IN reasons | r.name],
+    measures: [m IN measures | m.description],
+    location_ids: [l IN locations | elementId(l)],
+    symptom_id: elementId(symptom),
+    reason_ids: [r IN reasons | elementId(r)],
+    measure_ids: [m IN measures | elementId(m)],
+    score: score
+  } AS metadata
+"""
+
+TRAVERSAL_QUERIES = {
+    "rows": ROW_TRAVERSAL_QUERY,
+    "aggregated": AGGREGATED_TRAVERSAL_QUERY,
+}
+
+
+def traversal_query(mode: str = None) -> str:
+    mode = (mode or os.getenv("RETRIEVAL_TRAVERSAL") or "rows").strip().lower()
+    if mode not in TRAVERSAL_QUERIES:
+        raise RuntimeError(f"Unknown RETRIEVAL_TRAVERSAL {mode!r}; expected one of: {', '.join(TRAVERSAL_QUERIES)}")
+    return TRAVERSAL_QUERIES[mode]
+
+
+# Entity kinds in the metadata and their node labels, in display order
+ENTITY_LABELS = [
+    ("location", "FaultLocation"),
+    ("symptom", "FaultSymptom"),
+    ("reason", "FaultReason"),
+    ("measure", "FaultMeasure"),
+]
+
+
+def metadata_entities(meta: dict) -> dict:
+    """(element id, text) pairs per entity kind, from the metadata of either traversal mode."""
+    entities = {}
+    for kind, _ in ENTITY_LABELS:
+        if f"{kind}s" in meta:
+            pairs = zip_longest(meta.get(f"{kind}_ids") or [], meta.get(f"{kind}s") or [])
+        else:
+            pairs = [(meta.get(f"{kind}_id"), meta.get(kind))]
+        entities[kind] = [(node_id, text) for node_id, text in pairs if text]
+    return entities